@@ -1,6 +1,7 @@
 from django.contrib import admin
-from accounts_engine.models import CustomUser, InvalidatedToken
+from accounts_engine.models import CustomUser, InvalidatedToken, OtpMessage
 
 # Register your models here.
 admin.site.register(CustomUser)
 admin.site.register(InvalidatedToken)
+admin.site.register(OtpMessage)
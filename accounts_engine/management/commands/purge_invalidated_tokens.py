@@ -0,0 +1,37 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts_engine.revocation import purge_expired_tokens
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+
+class Command(BaseCommand):
+    help = "Delete the invalidated tokens that have expired, in batches. Runs once unless --interval is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.TOKEN_PURGE_BATCH_SIZE,
+            help="Rows deleted per transaction.",
+        )
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between batches.")
+        parser.add_argument("--interval", type=float, help="Keep running and purge every this many seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            deleted = purge_expired_tokens(options["batch_size"], options["pause"])
+            message = f"{deleted} expired invalidated tokens deleted in {time.perf_counter() - start:.2f}s"
+            logger_info.info(message)
+            self.stdout.write(message)
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,35 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts_engine.outbox import dispatcher
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+
+class Command(BaseCommand):
+    help = "Send the OTP SMS of the outbox. Set OTP_DISPATCH_IN_PROCESS=False in the web processes when running it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=dispatcher.poll_seconds,
+            help="Seconds to wait between polls when no message is due.",
+        )
+        parser.add_argument("--once", action="store_true", help="Send the due messages once and exit.")
+
+    def handle(self, *args, **options):
+        logger_info.info("OTP dispatcher started")
+        while True:
+            claimed = dispatcher.dispatch()
+            if claimed:
+                self.stdout.write(f"{claimed} OTP messages handled")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -2,6 +2,8 @@ import time
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from accounts_engine.managers import CustomUserManager
+from accounts_engine.user_cache import user_cache
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -62,11 +64,58 @@ class CustomUser(AbstractUser, BaseClass):
             self.contact += f"_time_{int(time.time())}_deleted"
 
         super(CustomUser, self).save(*args, **kwargs)
+        self.invalidate_cached_user()
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super(CustomUser, self).delete(*args, **kwargs)
+        self.invalidate_cached_user(user_id)
+        return result
+
+    def invalidate_cached_user(self, user_id=None):
+        # The next request of the user reads it from the database again (see CachedJWTAuthentication)
+        user_cache.invalidate(self.pk if user_id is None else user_id)
 
 
 class InvalidatedToken(models.Model):
-    token = models.TextField(unique=True)
-    invalidated_at = models.DateTimeField(auto_now_add=True)
+    # Logged out token of the rows saved before token_digest and expires_at, new rows leave it empty.
+    # These rows are still honoured and are purged one token lifetime after their logout.
+    token = models.TextField(unique=True, null=True, editable=False)
+    # sha256 of the logged out token, the token itself is not stored (see accounts_engine.revocation)
+    token_digest = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    # Expiry of the token, the row is purged after it
+    expires_at = models.DateTimeField(null=True, db_index=True)
+    invalidated_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Token: {(self.token_digest or self.token)[:12]} | Invalidated at: {self.invalidated_at}"
+
+
+class OtpMessage(models.Model):
+    """OTP to send, written in the transaction that gives the user the OTP (see accounts_engine.outbox)."""
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="otp_messages")
+    contact = PhoneNumberField()
+    otp = models.CharField(max_length=4)
+    domain = models.CharField(max_length=255, help_text="Host of the request, for the SMS status callback.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    message_sid = models.CharField(max_length=64, null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    created_datetime = models.DateTimeField(auto_now_add=True)
+    updated_datetime = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Token: {self.token} | Invalidated at: {self.invalidated_at}"
+        return f"OTP for {self.contact} | {self.status}"
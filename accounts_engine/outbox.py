@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts_engine.models import CustomUser, OtpMessage
+from accounts_engine.sms import generate_otp, send_otp
+from accounts_engine.sms_status import save_statuses
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+
+# Fields of the user enqueue_otp changes, to save them with update_fields
+OTP_FIELDS = ["otp", "otp_send_datetime", "updated_datetime"]
+
+
+def enqueue_otp(user, domain):
+    """
+    Give ``user`` a new OTP, not saved yet, and add its SMS to the outbox. Call it inside the
+    transaction that saves the user (``user.save(update_fields=OTP_FIELDS)``): the SMS is sent
+    by the dispatcher once that commits.
+    """
+    otp = generate_otp()
+    user.otp = otp
+    user.otp_send_datetime = timezone.now()
+    OtpMessage.objects.create(user=user, contact=user.contact, otp=otp, domain=domain)
+    transaction.on_commit(dispatcher.wake)
+    return otp
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` calls per second on average, bursts of up to ``burst`` calls."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next call is allowed, a rate of 0 allows every call."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def requeue_stale_messages(timeout):
+    # Messages of a process that died while sending them are sent again, possibly twice
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return OtpMessage.objects.filter(status=OtpMessage.SENDING, updated_datetime__lt=cutoff).update(
+        status=OtpMessage.PENDING
+    )
+
+
+def claim_messages(limit):
+    """Mark up to ``limit`` due messages as sending and return them, oldest first."""
+    with transaction.atomic():
+        messages = list(
+            OtpMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=OtpMessage.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at")[:limit]
+        )
+        OtpMessage.objects.filter(id__in=[message.id for message in messages]).update(
+            status=OtpMessage.SENDING, updated_datetime=timezone.now()
+        )
+    for message in messages:
+        message.status = OtpMessage.SENDING
+    return messages
+
+
+class OutboxDispatcher:
+    """
+    Sends the OTPs of the outbox, ``workers`` SMS at a time and at most ``rate`` per second.
+
+    A send that may succeed later (network error, rate limit or server error of the provider) is
+    retried after ``retry_seconds``, doubled on every attempt, until ``max_attempts``; the user's
+    last_otp_status is then "failed". An OTP replaced by a newer one before it was sent is not
+    sent. In the web processes the dispatcher runs on a background thread started with the
+    application (see drone_flight_planner.wsgi), woken by every commit that adds a message and
+    polling every ``poll_seconds`` for retries and the messages of other processes; the
+    run_otp_dispatcher command runs it in a process of its own instead.
+    """
+
+    def __init__(
+        self, workers=8, rate=10, max_attempts=5, retry_seconds=2, poll_seconds=5, send_timeout=60, in_process=True
+    ):
+        self.workers = workers
+        self.rate_limiter = RateLimiter(rate)
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+        self.send_timeout = send_timeout
+        self.in_process = in_process
+        self._executor = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the dispatcher thread of this process, if not started yet."""
+        if not self.in_process:
+            return
+        with self._lock:
+            # Threads do not survive a fork: a forked worker starts its own
+            if self._pid != os.getpid():
+                self._executor = None
+                self._thread = threading.Thread(target=self.run, name="otp-dispatcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def wake(self):
+        if not self.in_process:
+            return
+        self.start()
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.clear()
+            try:
+                claimed = self.dispatch()
+            except Exception as e:
+                logger_error.error(f"OTP dispatch failed: {str(e)}")
+                claimed = 0
+            finally:
+                # The database connection of this thread is not closed by a request
+                connections.close_all()
+            if not claimed:
+                self._wake.wait(self.poll_seconds)
+
+    def dispatch(self):
+        """Send one batch of due messages, returns how many were claimed."""
+        requeued = requeue_stale_messages(self.send_timeout)
+        if requeued:
+            logger_error.warning(f"Requeued {requeued} OTP messages stuck in sending")
+
+        messages = claim_messages(self.workers * 4)
+        if not messages:
+            return 0
+
+        current = dict(
+            CustomUser.objects.filter(id__in={message.user_id for message in messages}).values_list("id", "otp")
+        )
+        superseded = [message for message in messages if current.get(message.user_id) != message.otp]
+        to_send = [message for message in messages if current.get(message.user_id) == message.otp]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="otp-send")
+        futures = [self._executor.submit(self.send, message) for message in to_send]
+        results = []
+        for message, future in zip(to_send, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # Only this message is retried, the results of the others are still recorded
+                logger_error.error(f"Sending the OTP to {message.contact} failed: {str(e)}")
+                results.append({"success": False, "error": str(e), "retry": True})
+        self.record(to_send, results, superseded)
+        return len(messages)
+
+    def send(self, message):
+        self.rate_limiter.acquire()
+        return send_otp(message.contact, message.otp, message.domain)
+
+    def record(self, messages, results, superseded):
+        now = timezone.now()
+        failed = {}
+        for message, result in zip(messages, results):
+            message.attempts += 1
+            if result["success"]:
+                message.status = OtpMessage.SENT
+                message.message_sid = result["message_sid"]
+                message.error_message = None
+            elif result["retry"] and message.attempts < self.max_attempts:
+                message.status = OtpMessage.PENDING
+                message.next_attempt_at = now + timedelta(seconds=self.retry_seconds * 2 ** (message.attempts - 1))
+                message.error_message = result["error"]
+            else:
+                message.status = OtpMessage.FAILED
+                message.error_message = result["error"]
+                failed[str(message.contact)] = "failed"
+            message.updated_datetime = now
+
+        for message in superseded:
+            message.status = OtpMessage.FAILED
+            message.error_message = "Replaced by a newer OTP before it was sent."
+            message.updated_datetime = now
+
+        OtpMessage.objects.bulk_update(
+            messages + superseded,
+            ["status", "attempts", "next_attempt_at", "message_sid", "error_message", "updated_datetime"],
+        )
+        if failed:
+            save_statuses(failed)
+            logger_error.error(f"OTP could not be sent to {', '.join(failed)}")
+
+
+dispatcher = OutboxDispatcher(
+    workers=settings.OTP_DISPATCH_WORKERS,
+    rate=settings.OTP_SEND_RATE,
+    max_attempts=settings.OTP_SEND_MAX_ATTEMPTS,
+    retry_seconds=settings.OTP_SEND_RETRY_SECONDS,
+    poll_seconds=settings.OTP_DISPATCH_POLL_SECONDS,
+    send_timeout=settings.OTP_SEND_TIMEOUT_SECONDS,
+    in_process=settings.OTP_DISPATCH_IN_PROCESS,
+)
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts_engine.models import InvalidatedToken
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+# Rows saved this long before the last refresh are read again, in case their insert committed late
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+def token_digest(token):
+    """Fixed-size key of a token, the raw JWT is never stored."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_token_lifetime():
+    return settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]
+
+
+def get_expiry(expires_at, invalidated_at):
+    # Rows saved before expires_at was recorded expire at the latest one token lifetime after logout
+    return expires_at or invalidated_at + get_token_lifetime()
+
+
+class RevocationCache:
+    """
+    Digests of the revoked tokens that have not expired yet, with their expiry time.
+
+    The set is loaded once and then refreshed incrementally, at most every ``refresh_seconds``,
+    with the rows saved since the last refresh. Checking a token is a dict lookup; a logout in
+    another process is seen after at most ``refresh_seconds``. With ``refresh_seconds`` 0
+    every check is an indexed lookup of the digest instead.
+
+    Rows saved before the digest was stored only have the token, they are keyed by its digest
+    when loaded and matched on ``token`` by the per-check lookup.
+    """
+
+    def __init__(self, refresh_seconds=5):
+        self.refresh_seconds = refresh_seconds
+        self._expiry = {}
+        self._refreshed_at = None  # time.monotonic() of the last refresh
+        self._loaded_until = None  # invalidated_at covered by the last refresh
+        self._lock = threading.Lock()
+
+    def is_revoked(self, digest, token=None):
+        if self.refresh_seconds <= 0:
+            purger.maybe_start()
+            revoked = Q(token_digest=digest)
+            if token is not None:
+                revoked |= Q(token=token)
+            return InvalidatedToken.objects.filter(revoked).exists()
+
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+        return digest in self._expiry
+
+    def add(self, digest, expires_at):
+        """Record a revocation made by this process, without waiting for the next refresh."""
+        with self._lock:
+            self._expiry[digest] = expires_at
+
+    def refresh(self):
+        # The first load blocks, afterwards one thread refreshes while the others use the current set
+        if not self._lock.acquire(blocking=self._refreshed_at is None):
+            return
+        try:
+            now = timezone.now()
+            if self._loaded_until is None:
+                rows = InvalidatedToken.objects.filter(
+                    Q(expires_at__gt=now) | Q(expires_at__isnull=True, invalidated_at__gt=now - get_token_lifetime())
+                )
+            else:
+                rows = InvalidatedToken.objects.filter(invalidated_at__gte=self._loaded_until - REFRESH_OVERLAP)
+
+            expiry = {digest: expires_at for digest, expires_at in self._expiry.items() if expires_at > now}
+            for digest, token, expires_at, invalidated_at in rows.values_list(
+                "token_digest", "token", "expires_at", "invalidated_at"
+            ):
+                expiry[digest or token_digest(token)] = get_expiry(expires_at, invalidated_at)
+
+            self._expiry = expiry
+            self._loaded_until = now
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+        purger.maybe_start()
+
+    def clear(self):
+        with self._lock:
+            self._expiry = {}
+            self._refreshed_at = None
+            self._loaded_until = None
+
+
+def purge_expired_tokens(batch_size=10000, pause=0):
+    """
+    Delete the revocations whose token has expired (the token is rejected anyway) in batches of
+    ``batch_size`` rows, each its own short transaction, sleeping ``pause`` seconds in between.
+    Returns the number of rows deleted.
+    """
+    now = timezone.now()
+    expired = InvalidatedToken.objects.filter(
+        Q(expires_at__lt=now) | Q(expires_at__isnull=True, invalidated_at__lt=now - get_token_lifetime())
+    )
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if ids:
+            deleted += InvalidatedToken.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+class PeriodicPurge:
+    """Runs ``purge_expired_tokens`` on a background thread at most every ``interval`` seconds."""
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._last_run = None
+        self._lock = threading.Lock()
+
+    def maybe_start(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._last_run is not None and time.monotonic() - self._last_run < self.interval:
+                return
+            self._last_run = time.monotonic()
+        threading.Thread(target=self.run, name="purge-invalidated-tokens", daemon=True).start()
+
+    def run(self):
+        try:
+            deleted = purge_expired_tokens(self.batch_size)
+            if deleted:
+                logger_info.info(f"{deleted} expired invalidated tokens deleted")
+        except Exception as e:
+            logger_error.error(f"Purging expired invalidated tokens failed: {str(e)}")
+        finally:
+            # The thread has its own database connection
+            connections.close_all()
+
+
+revocation_cache = RevocationCache(refresh_seconds=settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+purger = PeriodicPurge(interval=settings.TOKEN_PURGE_INTERVAL_SECONDS, batch_size=settings.TOKEN_PURGE_BATCH_SIZE)
+
+
+def is_token_revoked(token):
+    return revocation_cache.is_revoked(token_digest(token), token)
+
+
+def revoke_token(token, expires_at):
+    """Store the revocation of ``token``, which is valid until ``expires_at``."""
+    digest = token_digest(token)
+    InvalidatedToken.objects.get_or_create(token_digest=digest, defaults={"expires_at": expires_at})
+    revocation_cache.add(digest, expires_at)
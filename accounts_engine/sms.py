@@ -1,13 +1,8 @@
-import os
-import threading
-import time
-
 from twilio.base.exceptions import TwilioRestException
-from twilio.rest import Client
-from django.conf import settings
 import random
 import logging
-from accounts_engine.models import CustomUser
+from accounts_engine.sms_gateway import get_gateway
+from accounts_engine.sms_status import status_poller
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,43 +12,35 @@ logger_info = logging.getLogger("info")
 logger_error = logging.getLogger("error")
 
 
-def check_status(client, message_sid, contact):
-    time.sleep(30)
-    message = client.messages(message_sid).fetch()
-    logger_info.info(f"Last SMS Status For {contact} : {message.status}")
-    user = CustomUser.objects.get(contact=contact)
-    user.last_otp_status = message.status
-    user.save()
+def generate_otp():
+    return random.randint(1000, 9999)
 
 
-def send_otp(contact, domain):
+def send_otp(contact, otp, domain):
+    """
+    Send the SMS with ``otp`` to ``contact`` and track its delivery status. ``retry`` tells the
+    outbox dispatcher whether sending again can succeed.
+    """
     try:
-        otp = random.randint(1000, 9999)
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
         body = f"Your Bot Lab Dynamics verification code is: {otp}"
         phone_number = "+" + str(contact.country_code) + str(contact.national_number)
-        message = client.messages.create(
-            body=body,
-            from_=os.getenv("TWILIO_PHONE_NUMBER"),
-            to=phone_number,
-            status_callback=f"http://{domain}/message-status/",
-        )
+        message_sid = get_gateway().send(phone_number, body, status_callback=f"http://{domain}/message-status/")
 
-        status_thread = threading.Thread(target=check_status, args=(client, message.sid, contact))
-        status_thread.start()
+        if not status_poller.submit(message_sid, contact):
+            logger_error.error(f"SMS status of {contact} not tracked, too many messages are waiting for a check")
 
         logger_info.info(f"verification otp: {otp}")
         logger_info.info("Successfully verification code sent.")
-        data = {"success": True, "otp": otp}
+        data = {"success": True, "message_sid": message_sid}
         return data
 
     except TwilioRestException as e:
-        print(e)
         logger_error.error("Twilio Error: " + str(e))
-        data = {"success": False, "otp": None}
+        # Rejected requests (an invalid number) fail again, rate limits and server errors may not
+        data = {"success": False, "error": str(e), "retry": e.status == 429 or e.status >= 500}
         return data
 
     except Exception as e:
-        logger_error.error("Invalid phone number entered" + str(e))
-        data = {"success": False, "otp": None}
+        logger_error.error(f"SMS to {contact} could not be sent: {str(e)}")
+        data = {"success": False, "error": str(e), "retry": True}
         return data
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+
+class GatewayBusy(Exception):
+    """No request slot became free within the timeout."""
+
+
+class TwilioGateway:
+    """
+    Twilio client shared by the whole process. Its HTTP connections stay open in a pool of
+    ``max_connections``, instead of a new session and TLS handshake for every SMS. At most
+    ``max_concurrency`` requests run at once, a caller waits up to ``timeout`` seconds for its
+    turn and every request times out after ``timeout`` seconds.
+    """
+
+    def __init__(
+        self, account_sid, auth_token, from_number, base_url="", timeout=10, max_connections=10, max_concurrency=10
+    ):
+        http_client = TwilioHttpClient(pool_connections=True, timeout=timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        http_client.session.mount("https://", adapter)
+        http_client.session.mount("http://", adapter)
+
+        self.client = Client(account_sid, auth_token, http_client=http_client)
+        if base_url:
+            # A local server with the paths of the Twilio REST API, see benchmarks/fake_sms_server.py
+            self.client.api.base_url = base_url
+        self.from_number = from_number
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise GatewayBusy(f"No SMS request slot free after {self.timeout}s")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def send(self, to, body, status_callback=None):
+        """Send an SMS and return its message sid, raises TwilioRestException when Twilio refuses it."""
+        with self._slot():
+            message = self.client.messages.create(
+                body=body, from_=self.from_number, to=to, status_callback=status_callback
+            )
+        return message.sid
+
+    def fetch_statuses(self, message_sids):
+        """``{sid: status}`` of the messages; a message the API reports an error for is left out."""
+        statuses = {}
+        for message_sid in message_sids:
+            try:
+                with self._slot():
+                    statuses[message_sid] = self.client.messages(message_sid).fetch().status
+            except TwilioRestException as e:
+                logger_error.error(f"SMS status of {message_sid} could not be read: {str(e)}")
+        return statuses
+
+
+class StubGateway:
+    """
+    Sends nothing: every SMS takes ``latency`` seconds, is kept in ``sent`` (the last 1000) and
+    reported delivered. For tests and load runs.
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.sent = deque(maxlen=1000)
+        self._message_sids = set()
+        self._lock = threading.Lock()
+
+    def send(self, to, body, status_callback=None):
+        if self.latency:
+            time.sleep(self.latency)
+        message_sid = f"SM{uuid.uuid4().hex}"
+        with self._lock:
+            self.sent.append({"sid": message_sid, "to": to, "body": body})
+            self._message_sids.add(message_sid)
+        return message_sid
+
+    def fetch_statuses(self, message_sids):
+        with self._lock:
+            return {message_sid: "delivered" for message_sid in message_sids if message_sid in self._message_sids}
+
+
+def create_gateway(backend):
+    if backend == "stub":
+        return StubGateway(latency=settings.SMS_STUB_LATENCY_SECONDS)
+    if backend == "twilio":
+        return TwilioGateway(
+            settings.TWILIO_ACCOUNT_SID,
+            settings.TWILIO_AUTH_TOKEN,
+            settings.TWILIO_PHONE_NUMBER,
+            base_url=settings.SMS_API_BASE_URL,
+            timeout=settings.SMS_TIMEOUT_SECONDS,
+            max_connections=settings.SMS_MAX_CONNECTIONS,
+            max_concurrency=settings.SMS_MAX_CONCURRENCY,
+        )
+    raise ValueError(f"SMS backend must be twilio or stub, not {backend}")
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The SMS gateway of this process (SMS_BACKEND), created on first use so that forked workers do not share it."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = create_gateway(settings.SMS_BACKEND)
+        return _gateway
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from accounts_engine.models import CustomUser
+from accounts_engine.sms_gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+# Statuses after which a message does not change any more
+FINAL_STATUSES = {"delivered", "undelivered", "failed", "canceled", "read"}
+
+
+def save_statuses(statuses):
+    """Write ``{contact: status}`` to the users' last_otp_status with a single bulk_update."""
+    users = list(CustomUser.objects.filter(contact__in=list(statuses)))
+    now = timezone.now()
+    for user in users:
+        user.last_otp_status = statuses[str(user.contact)]
+        user.updated_datetime = now
+    CustomUser.objects.bulk_update(users, ["last_otp_status", "updated_datetime"])
+    # bulk_update does not go through CustomUser.save
+    for user in users:
+        user.invalidate_cached_user()
+    return len(users)
+
+
+class StatusPoller:
+    """
+    Delivery status of the sent OTPs, checked by one thread per process.
+
+    A message is checked ``delay`` seconds after it was sent, and again every ``delay`` seconds
+    until its status is final or it was checked ``max_attempts`` times. Each round reads the
+    status of up to ``batch_size`` due messages through ``transport`` (the SMS gateway by default) and saves them in one
+    query. At most ``max_pending`` messages wait; more are not tracked (``submit`` returns
+    False) and keep the status of the Twilio status callback, if any.
+    """
+
+    def __init__(self, transport=None, delay=30, batch_size=100, max_pending=10000, max_attempts=3):
+        self.transport = transport
+        self.delay = delay
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        # (due time, sid, contact, attempt), in due order as the delay is the same for all
+        self._pending = deque()
+        # Sid of the last OTP of every contact, the status of an older one is not saved over it
+        self._latest = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, message_sid, contact):
+        contact = str(contact)
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((time.monotonic() + self.delay, message_sid, contact, 1))
+            self._latest[contact] = message_sid
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="sms-status-poller", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return True
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def run(self):
+        if self.transport is None:
+            self.transport = get_gateway()
+        while True:
+            batch = self._next_batch()
+            try:
+                self.poll(batch)
+            except Exception as e:
+                logger_error.error(f"Polling the status of {len(batch)} SMS failed: {str(e)}")
+                self._done(batch, {})
+            finally:
+                # The database connection of this thread is not closed by a request
+                connections.close_all()
+
+    def _next_batch(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._pending and self._pending[0][0] <= now:
+                    break
+                self._condition.wait(self._pending[0][0] - now if self._pending else None)
+
+            batch = []
+            while self._pending and self._pending[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(self._pending.popleft())
+            return batch
+
+    def poll(self, batch):
+        statuses = self.transport.fetch_statuses([message_sid for _, message_sid, _, _ in batch])
+        latest = self._done(batch, statuses)
+        if latest:
+            save_statuses(latest)
+        for contact, status in latest.items():
+            logger_info.info(f"Last SMS Status For {contact} : {status}")
+
+    def _done(self, batch, statuses):
+        """Queue the messages to check again and return the statuses to save, by contact."""
+        latest = {}
+        with self._condition:
+            for _, message_sid, contact, attempt in batch:
+                status = statuses.get(message_sid)
+                is_latest = self._latest.get(contact) == message_sid
+                if status is not None and is_latest:
+                    latest[contact] = status
+
+                if status not in FINAL_STATUSES and attempt < self.max_attempts:
+                    self._pending.append((time.monotonic() + self.delay, message_sid, contact, attempt + 1))
+                elif is_latest:
+                    del self._latest[contact]
+        return latest
+
+
+status_poller = StatusPoller(
+    delay=settings.SMS_STATUS_DELAY_SECONDS,
+    batch_size=settings.SMS_STATUS_BATCH_SIZE,
+    max_pending=settings.SMS_STATUS_MAX_PENDING,
+    max_attempts=settings.SMS_STATUS_MAX_ATTEMPTS,
+)
@@ -1,3 +1,318 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts_engine.authentication import CachedJWTAuthentication
+from accounts_engine.models import CustomUser, InvalidatedToken, OtpMessage
+from accounts_engine.outbox import OTP_FIELDS, OutboxDispatcher, enqueue_otp
+from accounts_engine.revocation import (
+    RevocationCache,
+    is_token_revoked,
+    purge_expired_tokens,
+    purger,
+    revocation_cache,
+    revoke_token,
+    token_digest,
+)
+from accounts_engine.sms_status import StatusPoller
+from accounts_engine.user_cache import UserCache
+
+SENT = {"success": True, "message_sid": "SM1"}
+TIMEOUT = {"success": False, "error": "timed out", "retry": True}
+REJECTED = {"success": False, "error": "invalid number", "retry": False}
+
+
+class RevocationTests(TestCase):
+    def setUp(self):
+        # No background purge thread during the tests
+        patcher = mock.patch.object(purger, "interval", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.expires_at = timezone.now() + timedelta(hours=1)
+
+    def revoke(self, digest, expires_at=None):
+        return InvalidatedToken.objects.create(token_digest=digest, expires_at=expires_at or self.expires_at)
+
+    def test_first_check_loads_the_revoked_tokens(self):
+        self.revoke("a")
+        self.revoke("expired", timezone.now() - timedelta(minutes=1))
+        cache = RevocationCache(refresh_seconds=60)
+        self.assertTrue(cache.is_revoked("a"))
+        self.assertFalse(cache.is_revoked("expired"))
+        self.assertFalse(cache.is_revoked("b"))
+
+    def test_refresh_reads_new_revocations_and_drops_expired_ones(self):
+        cache = RevocationCache(refresh_seconds=60)
+        cache.add("old", timezone.now() - timedelta(seconds=1))
+        self.assertFalse(cache.is_revoked("b"))
+
+        # Revoked by another process: seen after the next refresh
+        self.revoke("b")
+        self.assertFalse(cache.is_revoked("b"))
+        cache.refresh()
+        self.assertTrue(cache.is_revoked("b"))
+        self.assertFalse(cache.is_revoked("old"))
+
+    def test_refresh_interval_zero_queries_every_check(self):
+        cache = RevocationCache(refresh_seconds=0)
+        self.assertFalse(cache.is_revoked("a"))
+        self.revoke("a")
+        self.assertTrue(cache.is_revoked("a"))
+
+    def test_revoke_token_is_seen_at_once(self):
+        revocation_cache.clear()
+        self.addCleanup(revocation_cache.clear)
+        self.assertFalse(is_token_revoked("token"))
+        revoke_token("token", self.expires_at)
+        revoke_token("token", self.expires_at)
+        self.assertTrue(is_token_revoked("token"))
+        self.assertEqual(InvalidatedToken.objects.get().token_digest, token_digest("token"))
+
+    def test_purge_deletes_only_expired_tokens_in_batches(self):
+        expired = timezone.now() - timedelta(minutes=1)
+        for index in range(5):
+            self.revoke(f"expired-{index}", expired)
+        self.revoke("live-1")
+        self.revoke("live-2")
+
+        self.assertEqual(purge_expired_tokens(batch_size=2), 5)
+        self.assertEqual(sorted(InvalidatedToken.objects.values_list("token_digest", flat=True)), ["live-1", "live-2"])
+        self.assertEqual(purge_expired_tokens(batch_size=2), 0)
+
+    def test_rows_saved_before_the_digest_are_still_revoked(self):
+        InvalidatedToken.objects.create(token="legacy")
+        old = InvalidatedToken.objects.create(token="legacy-expired")
+        InvalidatedToken.objects.filter(id=old.id).update(invalidated_at=timezone.now() - timedelta(hours=4))
+
+        for refresh_seconds in (60, 0):
+            with self.subTest(refresh_seconds=refresh_seconds), mock.patch(
+                "accounts_engine.revocation.revocation_cache", RevocationCache(refresh_seconds)
+            ):
+                self.assertTrue(is_token_revoked("legacy"))
+                self.assertFalse(is_token_revoked("token"))
+        self.assertFalse(RevocationCache(refresh_seconds=60).is_revoked(token_digest("legacy-expired")))
+
+        # Purged one token lifetime after the logout
+        self.assertEqual(purge_expired_tokens(), 1)
+        self.assertEqual(InvalidatedToken.objects.get().token, "legacy")
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(contact="+919999999992", username="pilot", is_active=True)
+        self.cache = UserCache(ttl=60, revalidate_seconds=60)
+        for module in ("accounts_engine.authentication", "accounts_engine.models"):
+            patcher = mock.patch(f"{module}.user_cache", self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def authenticate(self):
+        return CachedJWTAuthentication().get_user(AccessToken.for_user(self.user))
+
+    def test_hits_are_independent_users(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            first = self.authenticate()
+            second = self.authenticate()
+
+        self.assertEqual(first, self.user)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first._state, second._state)
+        self.assertFalse(first._state.adding)
+        first.username = "changed"
+        first._state.fields_cache["related"] = object()
+        self.assertEqual(self.authenticate().username, "pilot")
+        self.assertEqual(self.authenticate()._state.fields_cache, {})
+
+    def test_save_and_delete_invalidate_the_user(self):
+        self.authenticate()
+        self.user.username = "renamed"
+        self.user.save()
+        self.assertIsNone(self.cache.get(self.user.id))
+        self.assertEqual(self.authenticate().username, "renamed")
+
+        self.user.delete()
+        self.assertIsNone(self.cache.get(self.user.id))
+
+    def test_user_read_before_an_invalidation_is_not_cached(self):
+        generation = self.cache.generation
+        self.cache.invalidate(12345)
+        self.cache.set(self.user.id, self.user, generation)
+        self.assertIsNone(self.cache.get(self.user.id))
+
+    def test_revalidation_drops_users_changed_in_another_process(self):
+        other = CustomUser.objects.create_user(contact="+919999999993", username="other", is_active=True)
+        self.authenticate()
+        self.cache.set(other.id, other, self.cache.generation)
+
+        # Saved by another process: this process' cache is not told
+        CustomUser.objects.filter(id=self.user.id).update(is_active=False, updated_datetime=timezone.now())
+        self.assertIsNotNone(self.cache.get(self.user.id))
+
+        with self.assertNumQueries(1):
+            self.cache.revalidate()
+        self.assertIsNone(self.cache.get(self.user.id))
+        self.assertIsNotNone(self.cache.get(other.id))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(contact="+919999999991", username="pilot")
+        self.dispatcher = OutboxDispatcher(workers=1, rate=0, max_attempts=2, retry_seconds=60, in_process=False)
+
+    def enqueue(self):
+        enqueue_otp(self.user, "testserver")
+        self.user.save(update_fields=OTP_FIELDS)
+        return OtpMessage.objects.latest("id")
+
+    def dispatch(self, *results):
+        with mock.patch("accounts_engine.outbox.send_otp", side_effect=results) as send_otp:
+            claimed = self.dispatcher.dispatch()
+        return claimed, send_otp
+
+    def test_enqueue_saves_the_otp_and_its_message(self):
+        message = self.enqueue()
+        self.user.refresh_from_db()
+        self.assertEqual(message.otp, self.user.otp)
+        self.assertEqual(message.status, OtpMessage.PENDING)
+        self.assertEqual(message.domain, "testserver")
+
+    def test_dispatch_sends_pending_messages(self):
+        message = self.enqueue()
+        claimed, send_otp = self.dispatch(SENT)
+
+        self.assertEqual(claimed, 1)
+        send_otp.assert_called_once_with(message.contact, message.otp, "testserver")
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.message_sid), (OtpMessage.SENT, 1, "SM1"))
+        self.assertEqual(self.dispatch()[0], 0)
+
+    def test_retry_later_then_fail(self):
+        message = self.enqueue()
+        before = timezone.now()
+        self.dispatch(TIMEOUT)
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OtpMessage.PENDING, 1))
+        self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=60))
+        # Not due yet
+        self.assertEqual(self.dispatch()[0], 0)
+
+        OtpMessage.objects.filter(id=message.id).update(next_attempt_at=timezone.now())
+        self.dispatch(TIMEOUT)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OtpMessage.FAILED, 2))
+        self.assertEqual(message.error_message, "timed out")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_otp_status, "failed")
+
+    def test_rejected_message_is_not_retried(self):
+        message = self.enqueue()
+        self.dispatch(REJECTED)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OtpMessage.FAILED, 1))
+
+    def test_retry_after_success(self):
+        message = self.enqueue()
+        self.dispatch(TIMEOUT)
+        OtpMessage.objects.filter(id=message.id).update(next_attempt_at=timezone.now())
+        self.dispatch(SENT)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.error_message), (OtpMessage.SENT, 2, None))
+
+    def test_a_failing_send_does_not_lose_the_batch(self):
+        first = self.enqueue()
+        second = CustomUser.objects.create_user(contact="+919999999997", username="second")
+        enqueue_otp(second, "testserver")
+        second.save(update_fields=OTP_FIELDS)
+        claimed, send_otp = self.dispatch(ConnectionError("reset"), SENT)
+
+        self.assertEqual((claimed, send_otp.call_count), (2, 2))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.error_message), (OtpMessage.PENDING, 1, "reset"))
+        self.assertEqual(OtpMessage.objects.get(user=second).status, OtpMessage.SENT)
+
+    def test_start_runs_the_dispatcher_without_a_new_message(self):
+        dispatcher = OutboxDispatcher(poll_seconds=3600, in_process=True)
+        dispatched = threading.Event()
+        with mock.patch.object(dispatcher, "dispatch", side_effect=lambda: dispatched.set() or 0):
+            dispatcher.start()
+            thread = dispatcher._thread
+            dispatcher.start()
+            self.assertTrue(dispatched.wait(5))
+        self.assertIs(dispatcher._thread, thread)
+        self.assertTrue(thread.is_alive())
+
+        self.dispatcher.start()
+        self.assertIsNone(self.dispatcher._thread)
+
+    def test_replaced_otp_is_not_sent(self):
+        with mock.patch("accounts_engine.outbox.generate_otp", side_effect=[1111, 2222]):
+            first = self.enqueue()
+            second = self.enqueue()
+        claimed, send_otp = self.dispatch(SENT)
+
+        self.assertEqual(claimed, 2)
+        send_otp.assert_called_once_with(second.contact, "2222", "testserver")
+        first.refresh_from_db()
+        self.assertEqual(first.status, OtpMessage.FAILED)
+        self.assertEqual(first.attempts, 0)
+
+
+class StatusPollerTests(TestCase):
+    def setUp(self):
+        self.first = CustomUser.objects.create_user(contact="+919999999995", username="first")
+        self.second = CustomUser.objects.create_user(contact="+919999999996", username="second")
+        self.transport = mock.Mock()
+        self.poller = StatusPoller(transport=self.transport, delay=0, max_pending=3, max_attempts=2)
+        # The rounds are run by the test instead of the poller thread
+        patcher = mock.patch.object(StatusPoller, "run")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def round(self, statuses):
+        self.transport.fetch_statuses.return_value = statuses
+        self.poller.poll(self.poller._next_batch())
+
+    def last_otp_status(self, user):
+        user.refresh_from_db()
+        return user.last_otp_status
+
+    def test_final_status_is_saved_once(self):
+        self.poller.submit("SM1", self.first.contact)
+        self.poller.submit("SM2", self.second.contact)
+        self.round({"SM1": "delivered", "SM2": "sent"})
+
+        self.assertEqual(self.last_otp_status(self.first), "delivered")
+        self.assertEqual(self.last_otp_status(self.second), "sent")
+        # Only the message without a final status is checked again
+        self.assertEqual(self.poller.pending(), 1)
+        self.round({"SM2": "undelivered"})
+        self.transport.fetch_statuses.assert_called_with(["SM2"])
+        self.assertEqual(self.last_otp_status(self.second), "undelivered")
+        self.assertEqual((self.poller.pending(), self.poller._latest), (0, {}))
+
+    def test_gives_up_after_max_attempts(self):
+        self.poller.submit("SM1", self.first.contact)
+        self.round({"SM1": "queued"})
+        self.round({})
+        self.assertEqual((self.poller.pending(), self.poller._latest), (0, {}))
+        self.assertEqual(self.last_otp_status(self.first), "queued")
+
+    def test_status_of_a_replaced_otp_is_not_saved(self):
+        self.poller.submit("SM1", self.first.contact)
+        self.poller.submit("SM2", self.first.contact)
+        self.round({"SM1": "delivered", "SM2": "sent"})
+        self.assertEqual(self.last_otp_status(self.first), "sent")
 
-# Create your tests here.
+    def test_messages_over_max_pending_are_dropped(self):
+        for index in range(4):
+            self.poller.submit(f"SM{index}", self.first.contact)
+        self.assertEqual((self.poller.pending(), self.poller.dropped), (3, 1))
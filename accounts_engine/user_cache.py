@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+# Cached users checked against the database per query
+REVALIDATE_BATCH_SIZE = 1000
+
+
+class UserCache:
+    """
+    Users resolved from access tokens, kept ``ttl`` seconds and at most ``max_entries`` of them
+    (least recently used dropped first).
+
+    Only the field values are kept: every hit builds a new user from them, so a view changing
+    ``request.user`` (or anything cached on it) does not change what the next request gets.
+
+    ``CustomUser.save`` and ``delete`` invalidate the user in this process. Other processes drop
+    it at their next revalidation, at most every ``revalidate_seconds``: one query per
+    ``REVALIDATE_BATCH_SIZE`` cached users drops those deleted, deactivated or saved since they
+    were cached.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000, revalidate_seconds=5):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.revalidate_seconds = revalidate_seconds
+        self._users = OrderedDict()
+        # Bumped by every invalidation, a user read before it is not cached
+        self._generation = 0
+        self._revalidated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._revalidate_lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, user_id):
+        if self.ttl <= 0:
+            return None
+        if time.monotonic() - self._revalidated_at >= self.revalidate_seconds:
+            self.revalidate()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            model, db, values, cached_at = entry
+            if time.monotonic() - cached_at >= self.ttl:
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+        return model.from_db(db, get_attnames(model), values)
+
+    def set(self, user_id, user, generation):
+        """Cache ``user``, unless a user was invalidated since ``generation`` was read."""
+        if self.ttl <= 0:
+            return
+        values = tuple(getattr(user, attname) for attname in get_attnames(type(user)))
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._users[user_id] = (type(user), user._state.db, values, time.monotonic())
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+
+    def revalidate(self):
+        """Drop the cached users that changed in the database; one thread at a time, the others skip it."""
+        if not self._revalidate_lock.acquire(blocking=False):
+            return
+        try:
+            self._revalidated_at = time.monotonic()
+            model = get_user_model()
+            updated_index = get_attnames(model).index("updated_datetime")
+            with self._lock:
+                cached = {user_id: entry[2][updated_index] for user_id, entry in self._users.items()}
+
+            user_ids = list(cached)
+            current = set()
+            for start in range(0, len(user_ids), REVALIDATE_BATCH_SIZE):
+                stop = start + REVALIDATE_BATCH_SIZE
+                rows = model.objects.filter(id__in=user_ids[start:stop], is_active=True)
+                current.update(rows.values_list("id", "updated_datetime"))
+
+            stale = [
+                user_id for user_id, updated_datetime in cached.items() if (user_id, updated_datetime) not in current
+            ]
+            if stale:
+                with self._lock:
+                    self._generation += 1
+                    for user_id in stale:
+                        entry = self._users.get(user_id)
+                        # A user cached again meanwhile with newer values is kept
+                        if entry is not None and entry[2][updated_index] == cached[user_id]:
+                            del self._users[user_id]
+        finally:
+            self._revalidate_lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+
+def get_attnames(model):
+    return tuple(field.attname for field in model._meta.concrete_fields)
+
+
+user_cache = UserCache(
+    ttl=settings.AUTH_USER_CACHE_SECONDS,
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    revalidate_seconds=settings.AUTH_USER_CACHE_REVALIDATE_SECONDS,
+)
@@ -6,24 +6,25 @@ from dotenv import load_dotenv
 
 from rest_framework.decorators import action
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
+from rest_framework_simplejwt.utils import datetime_from_epoch
 
 from accounts_engine.utils import (
     success_true_response,
     success_false_response,
     check_otp,
 )
-from accounts_engine.models import CustomUser, InvalidatedToken
+from accounts_engine.authentication import CachedJWTAuthentication
+from accounts_engine.models import CustomUser
+from accounts_engine.revocation import revoke_token
 from accounts_engine.serializers import CustomUserSerializer, VerifyAccountSerializer
 
-from accounts_engine.sms import send_otp
+from accounts_engine.outbox import OTP_FIELDS, enqueue_otp
 from accounts_engine.status_code import BAD_REQUEST, INTERNAL_SERVER_ERROR
 
 logger = logging.getLogger(__name__)
@@ -33,7 +34,7 @@ load_dotenv()
 
 
 class CustomUserViewSet(ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     queryset = CustomUser.objects.filter(is_delete=False, is_admin=False).order_by("-created_datetime")
     serializer_class = CustomUserSerializer
 
@@ -89,32 +90,22 @@ class CustomUserViewSet(ModelViewSet):
                 instance = serializer.instance
 
                 # Perform modifications before accessing serializer.data
+                # The SMS is sent by the outbox dispatcher once this transaction commits
                 domain = request.get_host()
-                sms_details = send_otp(instance.contact, domain)
-                if sms_details["success"]:
-                    instance.otp = sms_details["otp"]
-                    instance.otp_send_datetime = timezone.now()
-                    instance.password = make_password(instance.password)
-                    instance.save()
-
-                    message = "Successfully signup verification otp send"
-                    logger_info.info(f"{message} Phone number: {instance.contact}")
-                    headers = self.get_success_headers(serializer.data)
-                    return Response(success_true_response(message=message), headers=headers)
-
-                else:
-                    instance.delete()
-                    message = "Invalid phone number entered"
-                    logger_error.error(message)
-                    return Response(success_false_response(message=message), status=BAD_REQUEST)
+                enqueue_otp(instance, domain)
+                instance.password = make_password(instance.password)
+                instance.save()
+
+                message = "Successfully signup verification otp send"
+                logger_info.info(f"{message} Phone number: {instance.contact}")
+                headers = self.get_success_headers(serializer.data)
+                return Response(success_true_response(message=message), headers=headers)
 
             user = user_queryset.first()
 
             domain = request.get_host()
-            sms_details = send_otp(user.contact, domain)
-            user.otp = sms_details["otp"]
-            user.otp_send_datetime = timezone.now()
-            user.save()
+            enqueue_otp(user, domain)
+            user.save(update_fields=OTP_FIELDS)
             message = "Successfully login verification otp send"
             logger_info.info(f"{message} Phone number: {user.contact}")
             return Response(success_true_response(message=message))
@@ -128,11 +119,13 @@ class CustomUserViewSet(ModelViewSet):
             )
 
     @action(detail=False, methods=["PUT", "PATCH"])
+    @transaction.atomic
     def update_user(self, request, *args, **kwargs):
 
         try:
             partial = kwargs.pop("partial", True)
-            instance = request.user
+            # request.user can be a cached copy, the serializer saves every field of the instance
+            instance = CustomUser.objects.select_for_update().get(pk=request.user.pk)
             serializer = self.get_serializer(instance, data=request.data, partial=partial)
             try:
                 serializer.is_valid(raise_exception=True)
@@ -229,7 +222,7 @@ class VerifyOTPViewSet(ModelViewSet):
 
 
 class LogoutAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -237,7 +230,7 @@ class LogoutAPI(APIView):
 
             auth_header = request.META.get("HTTP_AUTHORIZATION")
             token = auth_header.split(" ")[1] if len(auth_header.split(" ")) > 1 else auth_header
-            InvalidatedToken.objects.create(token=token)
+            revoke_token(token, expires_at=datetime_from_epoch(request.auth["exp"]))
 
             message = "Successfully logout."
             response = Response(success_true_response(message=message))
@@ -255,17 +248,17 @@ class LogoutAPI(APIView):
 
 
 class SendOtpAPI(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         try:
-            user = request.user
+            # request.user can be a cached copy, only the OTP fields are written from the locked row
+            user = CustomUser.objects.select_for_update().get(pk=request.user.pk)
             domain = request.get_host()
-            sms_details = send_otp(user.contact, domain)
-            user.otp = sms_details["otp"]
-            user.otp_send_datetime = timezone.now()
-            user.save()
+            enqueue_otp(user, domain)
+            user.save(update_fields=OTP_FIELDS)
             message = "Successfully otp send to your registered number}"
             logger_info.info(f"{message} Phone number: {user.contact}")
             return Response(success_true_response(message=message))
@@ -0,0 +1,121 @@
+"""
+Local stand-in for the Twilio messages API, to run the OTP flow without sending SMS.
+
+    python benchmarks/fake_sms_server.py [--port 8025] [--latency 0.2] [--deliver-after 5] [--fail-rate 0.05]
+
+Point the project at it with SMS_API_BASE_URL=http://127.0.0.1:8025 (any TWILIO_ACCOUNT_SID and
+TWILIO_AUTH_TOKEN). It answers the requests the Twilio client makes to create a message
+(POST /2010-04-01/Accounts/<account>/Messages.json) and to fetch one
+(GET /2010-04-01/Accounts/<account>/Messages/<sid>.json). Every response is delayed by
+--latency seconds. A message is "sent" until --deliver-after seconds have passed, then
+"delivered", or "undelivered" for a --fail-rate share of them. Messages are kept in memory.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/(?P<account>[^/]+)/Messages(?:/(?P<sid>[^/]+))?\.json$")
+
+
+class MessageStore:
+    def __init__(self, deliver_after, fail_rate):
+        self.deliver_after = deliver_after
+        self.fail_rate = fail_rate
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def create(self, account, fields):
+        message = {
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": account,
+            "to": fields.get("To"),
+            "from": fields.get("From"),
+            "body": fields.get("Body"),
+            "date_created": formatdate(usegmt=True),
+            "created": time.monotonic(),
+            "fails": random.random() < self.fail_rate,
+        }
+        with self._lock:
+            self._messages[message["sid"]] = message
+        return self.resource(message)
+
+    def get(self, sid):
+        with self._lock:
+            message = self._messages.get(sid)
+        return self.resource(message) if message else None
+
+    def resource(self, message):
+        if time.monotonic() - message["created"] < self.deliver_after:
+            status = "sent"
+        else:
+            status = "undelivered" if message["fails"] else "delivered"
+        resource = {name: value for name, value in message.items() if name not in ("created", "fails")}
+        resource.update(status=status, num_segments="1", direction="outbound-api")
+        return resource
+
+
+def make_handler(store, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, Nagle would hold the body of kept-alive connections
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, payload):
+            time.sleep(latency)
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            match = MESSAGES_PATH.match(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            fields = {name: values[0] for name, values in parse_qs(self.rfile.read(length).decode()).items()}
+            if not match or match["sid"]:
+                return self.reply(404, {"code": 20404, "message": "Not found", "status": 404})
+            self.reply(201, store.create(match["account"], fields))
+
+        def do_GET(self):
+            match = MESSAGES_PATH.match(self.path)
+            message = store.get(match["sid"]) if match and match["sid"] else None
+            if message is None:
+                return self.reply(404, {"code": 20404, "message": "Not found", "status": 404})
+            self.reply(200, message)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0, help="Seconds every response is delayed.")
+    parser.add_argument("--deliver-after", type=float, default=5, help="Seconds a message stays sent.")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Share of the messages never delivered.")
+    options = parser.parse_args()
+
+    store = MessageStore(options.deliver_after, options.fail_rate)
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(store, options.latency))
+    server.daemon_threads = True
+    print(f"Fake SMS API on http://{options.host}:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
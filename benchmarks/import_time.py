@@ -0,0 +1,87 @@
+"""
+Cold start benchmark: time and peak memory of fresh interpreters running management commands
+and loading the WSGI application with its URLconf, and whether the heavy planning and plotting
+libraries got imported.
+
+    python benchmarks/import_time.py [--runs 5] [--json result.json]
+
+Uses DJANGO_SETTINGS_MODULE when set, otherwise the project settings (and .env).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("shapely", "matplotlib")
+
+# Printed by the child at exit: peak RSS and which heavy modules were imported
+REPORT = (
+    "import atexit, json, resource, sys\n"
+    "atexit.register(lambda: print(json.dumps({"
+    "'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "
+    f"'loaded': [name for name in {HEAVY_MODULES!r} if name in sys.modules]"
+    "}), file=sys.stderr))\n"
+)
+
+
+def _manage(*args):
+    return f"import runpy\nsys.argv = {['manage.py', *args]!r}\nrunpy.run_path('manage.py', run_name='__main__')\n"
+
+
+SCENARIOS = {
+    "manage.py help": _manage("help"),
+    "planning worker": _manage("run_planning_worker", "--help"),
+    "wsgi application": (
+        "import os\n"
+        "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drone_flight_planner.settings')\n"
+        "from drone_flight_planner.wsgi import application\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+}
+
+
+def run_once(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", REPORT + code], cwd=ROOT, capture_output=True, text=True)
+    if not result.stderr.strip():
+        raise RuntimeError(f"Benchmark process failed with exit code {result.returncode}")
+    elapsed = time.perf_counter() - start
+    report = json.loads(result.stderr.strip().splitlines()[-1])
+    return elapsed, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    options = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        run_once(code)  # Warm the filesystem and bytecode caches
+        timings, reports = zip(*(run_once(code) for _ in range(options.runs)))
+        results[name] = {
+            "median_seconds": round(statistics.median(timings), 4),
+            "min_seconds": round(min(timings), 4),
+            "max_rss_mb": round(max(report["max_rss_kb"] for report in reports) / 1024, 1),
+            "heavy_modules_loaded": reports[-1]["loaded"],
+        }
+        print(
+            f"{name:<17} median {results[name]['median_seconds'] * 1000:7.1f} ms  "
+            f"peak RSS {results[name]['max_rss_mb']:6.1f} MB  loaded: {', '.join(reports[-1]['loaded']) or '-'}"
+        )
+
+    if options.json:
+        with open(options.json, "w") as output:
+            json.dump({"python": sys.version.split()[0], "runs": options.runs, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Micro-benchmarks of the waypoint generator stages over a matrix of fields and flight settings:
+get_bounding_box, the vertical and horizontal waypoints, generate_all_points, filter_points and
+the whole grid pipeline of the create endpoint. Runs in-process, without settings or a database.
+
+    python benchmarks/pipeline.py [--repeat 5] [--full] [--vertices 4,1000] [--json result.json]
+    python benchmarks/pipeline.py --compare before.json
+    python benchmarks/pipeline.py --replay profiles/<id>/request.json
+
+Every parameter list starts with its baseline value. By default each parameter is varied on its
+own around the baseline case, --full runs the cartesian product instead. --modes also times
+plan_waypoints with the given planning modes.
+
+Reported per stage: median wall time, points per second (grid points handled, polygon vertices
+for the bounding box) and peak traced memory, measured in a separate tracemalloc run so that
+tracing does not skew the timings. --compare prints the median time ratio against an earlier
+--json file for the cases both runs have.
+
+--replay runs the stages, and plan_waypoints with the request's planning mode and settings, on the
+polygon of a create request saved by the profiling hook (waypoint_generator/profiling.py).
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from waypoint_generator.planner import PLANNING_MODES, plan_waypoints  # noqa: E402
+from waypoint_generator.services import GoProHero9Black  # noqa: E402
+from waypoint_generator.utils import (  # noqa: E402
+    convert_polygon_to_decimal,
+    filter_points,
+    generate_all_points,
+    generate_horizontal_waypoints,
+    generate_vertical_waypoints,
+    get_bounding_box,
+)
+
+EARTH_METERS_PER_DEGREE = 111320
+LONGITUDE = 86.6
+
+CONVEX = "convex"
+CONCAVE = "concave"
+
+# Baseline value first
+PARAMETERS = {
+    "vertices": [4, 100, 1000, 10000],
+    "area_km2": [1, 10, 100],
+    "shape": [CONVEX, CONCAVE],
+    "latitude": [23.8, 45, 70],
+    "altitude": [100, 200, 400],
+    "overlap": [75, 50, 94],
+}
+
+
+def _outline(vertices, shape):
+    """Unit outline in meters: a regular polygon, or a five-pointed star resampled to ``vertices``."""
+    if shape == CONVEX:
+        angles = 2 * math.pi * np.arange(vertices) / vertices
+        return np.cos(angles), np.sin(angles)
+
+    # Real field boundaries are dense along a few concave edges, not thousands of spikes
+    angles = 2 * math.pi * np.arange(10) / 10
+    radii = np.where(np.arange(10) % 2, 0.4, 1.0)
+    corners = np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+    closed = np.vstack([corners, corners[:1]])
+    lengths = np.hypot(*np.diff(closed, axis=0).T)
+    distances = np.concatenate([[0], np.cumsum(lengths)])
+    samples = np.linspace(0, distances[-1], max(vertices, 10), endpoint=False)
+    return np.interp(samples, distances, closed[:, 0]), np.interp(samples, distances, closed[:, 1])
+
+
+def make_polygon(vertices, area_km2, shape, latitude):
+    """Polygon of ``area_km2`` centred at ``latitude``; a concave one has at least 10 vertices."""
+    east, north = _outline(vertices, shape)
+    area = abs(np.dot(east, np.roll(north, -1)) - np.dot(north, np.roll(east, -1))) / 2
+    scale = math.sqrt(area_km2 * 1e6 / area)
+    meters_per_lon_degree = EARTH_METERS_PER_DEGREE * math.cos(math.radians(latitude))
+    return [
+        {
+            "latitude": latitude + y * scale / EARTH_METERS_PER_DEGREE,
+            "longitude": LONGITUDE + x * scale / meters_per_lon_degree,
+        }
+        for x, y in zip(east.tolist(), north.tolist())
+    ]
+
+
+def get_cases(parameters, full):
+    names = list(parameters)
+    if full:
+        for values in itertools.product(*parameters.values()):
+            yield dict(zip(names, values))
+        return
+
+    baseline = {name: values[0] for name, values in parameters.items()}
+    yield baseline
+    for name, values in parameters.items():
+        for value in values[1:]:
+            yield dict(baseline, **{name: value})
+
+
+def load_replay(path):
+    """Case, decimal polygon, planning mode and plan_waypoints options of a profiled create request."""
+    with open(path) as replay_file:
+        details = json.load(replay_file)
+    data = details["request"]
+    saved_settings = details.get("settings", {})
+
+    case = {
+        "replay": os.path.basename(os.path.dirname(os.path.abspath(path))),
+        "altitude": float(data["altitude"]),
+        "overlap": float(data["overlapping_percentage"]),
+    }
+    mode = data.get("planning_mode") or saved_settings.get("WAYPOINT_PLANNING_MODE")
+    plan_options = {
+        option: saved_settings[name]
+        for option, name in (
+            ("sweep_objective", "WAYPOINT_SWEEP_OBJECTIVE"),
+            ("search_budget", "WAYPOINT_SWEEP_SEARCH_SECONDS"),
+        )
+        if name in saved_settings
+    }
+    return case, convert_polygon_to_decimal(data["polygon_lat_lon"]), mode, plan_options
+
+
+def get_stages(case, modes, polygon=None, plan_options=None):
+    """(name, function, points handled) of every stage of ``case``, inputs prepared up front."""
+    camera = GoProHero9Black()
+    altitude, overlap = case["altitude"], case["overlap"]
+    coverage_vertical, coverage_horizontal = camera.get_fov(altitude)
+    if polygon is None:
+        polygon = make_polygon(case["vertices"], case["area_km2"], case["shape"], case["latitude"])
+    plan_options = plan_options or {}
+
+    bounding_box = get_bounding_box(polygon)
+    vertical = generate_vertical_waypoints(bounding_box, altitude, overlap, coverage_vertical)
+    horizontal = generate_horizontal_waypoints(bounding_box, altitude, overlap, coverage_horizontal)
+    all_points = generate_all_points(vertical, horizontal)
+
+    def waypoints():
+        generate_vertical_waypoints(bounding_box, altitude, overlap, coverage_vertical)
+        generate_horizontal_waypoints(bounding_box, altitude, overlap, coverage_horizontal)
+
+    def pipeline():
+        # Grid mode of the create endpoint
+        decimal_polygon = convert_polygon_to_decimal(polygon)
+        box = get_bounding_box(decimal_polygon)
+        vertical = generate_vertical_waypoints(box, altitude, overlap, coverage_vertical)
+        horizontal = generate_horizontal_waypoints(box, altitude, overlap, coverage_horizontal)
+        return filter_points(generate_all_points(vertical, horizontal), decimal_polygon)
+
+    stages = [
+        ("bounding_box", lambda: get_bounding_box(polygon), len(polygon)),
+        ("waypoints", waypoints, len(vertical) + len(horizontal)),
+        ("all_points", lambda: generate_all_points(vertical, horizontal), len(all_points)),
+        ("filter_points", lambda: filter_points(all_points, polygon), len(all_points)),
+        ("pipeline", pipeline, len(all_points)),
+    ]
+    for mode in modes:
+        stages.append(
+            (
+                f"plan_{mode}",
+                lambda mode=mode: plan_waypoints(
+                    polygon, overlap, coverage_vertical, coverage_horizontal, mode=mode, **plan_options
+                ),
+                len(all_points),
+            )
+        )
+    return stages, len(pipeline())
+
+
+def measure(function, points, repeat):
+    function()  # Warm up imports and caches
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "median_seconds": round(median, 6),
+        "min_seconds": round(min(timings), 6),
+        "points": points,
+        "points_per_second": round(points / median) if median > 0 else None,
+        "peak_memory_mb": round(peak / 1024 / 1024, 3),
+    }
+
+
+def case_label(case):
+    # 45 and 45.0 (from the command line) are the same case
+    return " ".join(
+        f"{name}={value:g}" if isinstance(value, (int, float)) else f"{name}={value}" for name, value in case.items()
+    )
+
+
+def compare(results, previous_file):
+    with open(previous_file) as previous_json:
+        previous = {case_label(case["case"]): case["stages"] for case in json.load(previous_json)["cases"]}
+
+    print(f"\nMedian time against {previous_file} (< 1 is faster):")
+    for result in results:
+        label = case_label(result["case"])
+        if label not in previous:
+            continue
+        ratios = [
+            f"{stage} {timing['median_seconds'] / previous[label][stage]['median_seconds']:.2f}x"
+            for stage, timing in result["stages"].items()
+            if previous[label].get(stage, {}).get("median_seconds")
+        ]
+        print(f"{label}\n    {'  '.join(ratios)}")
+
+
+def parse_values(values, cast):
+    return [cast(value) for value in values.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--full", action="store_true", help="Run the cartesian product of the parameters.")
+    for name, values in PARAMETERS.items():
+        cast = str if name == "shape" else type(values[0])
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=lambda text, cast=cast: parse_values(text, cast),
+            default=values,
+            help=f"Comma separated, baseline first (default {','.join(map(str, values))}).",
+        )
+    parser.add_argument(
+        "--modes",
+        type=lambda text: parse_values(text, str),
+        default=[],
+        help=f"Also time plan_waypoints with these modes ({','.join(PLANNING_MODES)}).",
+    )
+    parser.add_argument("--replay", help="request.json of a profiled request to run instead of the matrix.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare against.")
+    options = parser.parse_args()
+
+    if options.replay:
+        case, polygon, mode, plan_options = load_replay(options.replay)
+        modes = options.modes if mode in options.modes else options.modes + [mode]
+        runs = [(case, modes, polygon, plan_options)]
+    else:
+        parameters = {name: getattr(options, name) for name in PARAMETERS}
+        runs = [(case, options.modes, None, None) for case in get_cases(parameters, options.full)]
+
+    results = []
+    for case, modes, polygon, plan_options in runs:
+        stages, waypoint_count = get_stages(case, modes, polygon, plan_options)
+        result = {"case": case, "waypoints": waypoint_count, "stages": {}}
+        print(f"{case_label(case)}  waypoints={waypoint_count}")
+        for name, function, points in stages:
+            timing = measure(function, points, options.repeat)
+            result["stages"][name] = timing
+            print(
+                f"    {name:<14} {timing['median_seconds'] * 1000:9.2f} ms  "
+                f"{timing['points_per_second'] or 0:>12,} points/s  peak {timing['peak_memory_mb']:8.2f} MB"
+            )
+        results.append(result)
+
+    if options.json:
+        import shapely
+
+        with open(options.json, "w") as output:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "numpy": np.__version__,
+                    "shapely": shapely.__version__,
+                    "repeat": options.repeat,
+                    "cases": results,
+                },
+                output,
+                indent=2,
+            )
+
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == "__main__":
+    main()
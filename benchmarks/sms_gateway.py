@@ -0,0 +1,95 @@
+"""
+Latency of sending SMS with a new Twilio client per message, as send_otp used to, against the
+pooled client of accounts_engine.sms_gateway.TwilioGateway.
+
+    python benchmarks/fake_sms_server.py --latency 0.05 &
+    python benchmarks/sms_gateway.py [--url http://127.0.0.1:8025] [--messages 500] [--threads 8]
+                                     [--json result.json]
+
+Sends --messages SMS from --threads threads with each client and reports p50, p99 and the
+messages per second. The fake server speaks plain HTTP, so only the TCP connection is saved;
+against api.twilio.com every new client also pays a TLS handshake.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from twilio.rest import Client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accounts_engine.sms_gateway import TwilioGateway  # noqa: E402
+
+ACCOUNT_SID = "ACbenchmark"
+AUTH_TOKEN = "benchmark"
+FROM_NUMBER = "+15005550006"
+
+
+class ClientPerMessage:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def send(self, to, body):
+        client = Client(ACCOUNT_SID, AUTH_TOKEN)
+        client.api.base_url = self.base_url
+        return client.messages.create(body=body, from_=FROM_NUMBER, to=to).sid
+
+
+def run(sender, messages, threads):
+    def send(index):
+        start = time.perf_counter()
+        sender.send(f"+9199999{index:05d}", f"Your Bot Lab Dynamics verification code is: {index % 10000:04d}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        timings = sorted(executor.map(send, range(messages)))
+    seconds = time.perf_counter() - start
+    return {
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p99_ms": round(timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000, 2),
+        "messages_per_second": round(messages / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8025", help="Base URL of the (fake) SMS API.")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    options = parser.parse_args()
+
+    senders = {
+        "client_per_message": ClientPerMessage(options.url),
+        "pooled_gateway": TwilioGateway(
+            ACCOUNT_SID,
+            AUTH_TOKEN,
+            FROM_NUMBER,
+            base_url=options.url,
+            max_connections=options.threads,
+            max_concurrency=options.threads,
+        ),
+    }
+    results = {}
+    for name, sender in senders.items():
+        run(sender, options.threads, options.threads)  # Warm up
+        results[name] = run(sender, options.messages, options.threads)
+        result = results[name]
+        print(
+            f"{name:<20} p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+            f"{result['messages_per_second']:8.1f} messages/s"
+        )
+
+    if options.json:
+        with open(options.json, "w") as output:
+            json.dump({"messages": options.messages, "threads": options.threads, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
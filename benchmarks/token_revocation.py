@@ -0,0 +1,155 @@
+"""
+Latency of TokenInvalidatedMiddleware as the invalidated token table grows, from 10k to 10M rows.
+
+    python benchmarks/token_revocation.py [--sizes 10000,100000,1000000,10000000] [--live 10000]
+                                          [--json result.json]
+
+Runs against a throwaway test database of the configured engine (Django's test database, the real
+one is not touched), using DJANGO_SETTINGS_MODULE when set, otherwise the project settings (and
+.env). The table is grown to every size in turn; ``--live`` of the rows belong to tokens that have
+not expired yet, the others to expired tokens as they pile up without purging. For every size it
+reports, per middleware call, the median latency with the in-process revocation set and with a
+database lookup per request (TOKEN_REVOCATION_REFRESH_SECONDS=0), the time of the first (full)
+load of the set and finally how fast purge_expired_tokens deletes the expired rows.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drone_flight_planner.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from accounts_engine.models import InvalidatedToken  # noqa: E402
+from accounts_engine.revocation import purge_expired_tokens, purger, revocation_cache, token_digest  # noqa: E402
+from drone_flight_planner.custom_middleware import TokenInvalidatedMiddleware  # noqa: E402
+
+INSERT_BATCH = 10000
+
+
+def grow_table(count, live, existing):
+    """Insert rows until the table has ``count``, the first ``live`` of all rows unexpired."""
+    now = timezone.now()
+    live_expiry = now + timedelta(hours=3)
+    expired = now - timedelta(hours=1)
+    for start in range(existing, count, INSERT_BATCH):
+        InvalidatedToken.objects.bulk_create(
+            InvalidatedToken(
+                token_digest=token_digest(uuid.uuid4().hex),
+                expires_at=live_expiry if index < live else expired,
+            )
+            for index in range(start, min(start + INSERT_BATCH, count))
+        )
+
+
+def time_calls(middleware, requests, repeat):
+    timings = []
+    for _ in range(repeat):
+        for request in requests:
+            start = time.perf_counter()
+            middleware(request)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=[10000, 100000, 1000000, 10000000],
+    )
+    parser.add_argument("--live", type=int, default=10000, help="Rows of tokens that have not expired yet.")
+    parser.add_argument("--calls", type=int, default=2000, help="Middleware calls timed per size and mode.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    options = parser.parse_args()
+
+    # The rejected requests would log a line each, and the background purge would shrink the table
+    logging.disable(logging.INFO)
+    purger.interval = 0
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    factory = RequestFactory()
+    middleware = TokenInvalidatedMiddleware(lambda request: HttpResponse())
+    results = []
+    try:
+        existing = 0
+        for size in sorted(options.sizes):
+            start = time.perf_counter()
+            grow_table(size, options.live, existing)
+            existing = size
+            insert_seconds = time.perf_counter() - start
+
+            # Mostly tokens that were never revoked, as in real traffic, plus a revoked one
+            revoked = f"revoked-{size}"
+            InvalidatedToken.objects.create(
+                token_digest=token_digest(revoked), expires_at=timezone.now() + timedelta(hours=3)
+            )
+            existing += 1
+            tokens = [uuid.uuid4().hex for _ in range(99)] + [revoked]
+            requests = [factory.get("/", HTTP_AUTHORIZATION=f"Bearer {token}") for token in tokens]
+            repeat = max(options.calls // len(requests), 1)
+
+            revocation_cache.clear()
+            start = time.perf_counter()
+            revocation_cache.refresh()
+            load_seconds = time.perf_counter() - start
+            assert middleware(requests[-1]).status_code == 401
+            cached = time_calls(middleware, requests, repeat)
+
+            refresh_seconds = revocation_cache.refresh_seconds
+            revocation_cache.refresh_seconds = 0
+            try:
+                database = time_calls(middleware, requests, repeat)
+            finally:
+                revocation_cache.refresh_seconds = refresh_seconds
+
+            result = {
+                "rows": existing,
+                "insert_seconds": round(insert_seconds, 2),
+                "cached_check_us": round(cached * 1e6, 2),
+                "database_check_us": round(database * 1e6, 2),
+                "first_load_ms": round(load_seconds * 1000, 2),
+            }
+            results.append(result)
+            print(
+                f"{existing:>10,} rows  cached {result['cached_check_us']:8.2f} us  "
+                f"database {result['database_check_us']:8.2f} us  first load {result['first_load_ms']:8.2f} ms"
+            )
+
+        start = time.perf_counter()
+        deleted = purge_expired_tokens()
+        purge_seconds = time.perf_counter() - start
+        purge = {"deleted": deleted, "seconds": round(purge_seconds, 2)}
+        rate = deleted / max(purge_seconds, 1e-9)
+        print(f"purge: {deleted:,} expired rows in {purge_seconds:.2f}s ({rate:,.0f} rows/s)")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if options.json:
+        with open(options.json, "w") as output:
+            json.dump(
+                {"engine": connection.vendor, "live": options.live, "results": results, "purge": purge},
+                output,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
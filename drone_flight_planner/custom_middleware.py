@@ -1,8 +1,12 @@
 import logging
+import time
+
+from django.conf import settings
 from django.http import JsonResponse
 
 from accounts_engine.utils import success_false_response
-from accounts_engine.models import InvalidatedToken
+from accounts_engine.revocation import is_token_revoked
+from waypoint_generator.metrics import collect_timings, server_timing
 
 logger = logging.getLogger(__name__)
 logger_info = logging.getLogger("info")
@@ -15,11 +19,15 @@ class TokenInvalidatedMiddleware:
 
     def __call__(self, request):
 
+        auth_header = request.META.get("HTTP_AUTHORIZATION")
+        if not auth_header:
+            # Nothing to check, anonymous requests do not touch the revocation list
+            return self.get_response(request)
+
         try:
-            auth_header = request.META.get("HTTP_AUTHORIZATION")
             token = auth_header.split(" ")[1] if len(auth_header.split(" ")) > 1 else auth_header
-            if token in InvalidatedToken.objects.values_list("token", flat=True):
-                logger_info.info(f"Token: {token} is invalid.")
+            if is_token_revoked(token):
+                logger_info.info(f"Token: {token[-12:]} is invalid.")
                 response_data = success_false_response(message="Please login.")
                 response = JsonResponse(response_data, status=401)
                 return response
@@ -29,3 +37,25 @@ class TokenInvalidatedMiddleware:
 
         response = self.get_response(request)
         return response
+
+
+class ServerTimingMiddleware:
+    """
+    Sends the stages timed while handling the request (``timed_stage``/``planning_stage``) and
+    the total time as a ``Server-Timing`` header, when WAYPOINT_METRICS_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.WAYPOINT_METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        if timings:
+            timings.append(("total", time.perf_counter() - start))
+            response["Server-Timing"] = server_timing(timings)
+        return response
@@ -0,0 +1,211 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is then only safe within one process
+    fcntl = None
+
+BATCH_SIZE = 500  # Records written per lock/flush of a file handler
+
+_process = {"pid": None, "queue": None, "listener": None, "dropped": 0, "reported": 0}
+_process_lock = threading.Lock()
+
+
+# Handlers a QueuedHandler can write to, by the name dictConfig gave them
+_named_handlers = weakref.WeakValueDictionary()
+
+
+def _get_handler(name):
+    handler = _named_handlers.get(name)
+    if handler is None:
+        # dictConfig retries handlers failing with this message once the others are configured
+        raise ValueError(f"Handler {name!r}: target not configured yet (it must be a handler of this module)")
+    return handler
+
+
+class NamedHandlerMixin:
+    """Registers the handler under its dictConfig name, so that QueuedHandler can target it."""
+
+    def set_name(self, name):
+        super().set_name(name)
+        if name:
+            _named_handlers[name] = self
+
+    name = property(logging.Handler.get_name, set_name)
+
+
+class ConsoleHandler(NamedHandlerMixin, logging.StreamHandler):
+    pass
+
+
+def dropped_records():
+    """Log records dropped by this process because the queue was full."""
+    return _process["dropped"]
+
+
+def _get_queue(queue_size):
+    """Queue of the current process; a forked worker starts its own queue and listener thread."""
+    pid = os.getpid()
+    if _process["pid"] != pid:
+        with _process_lock:
+            if _process["pid"] != pid:
+                log_queue = queue.Queue(maxsize=queue_size)
+                listener = BatchingQueueListener(log_queue)
+                listener.start()
+                atexit.register(listener.stop)
+                _process.update(pid=pid, queue=log_queue, listener=listener, dropped=0, reported=0)
+    return _process["queue"]
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """
+    Request-path handler: puts the record on a bounded in-memory queue and returns, the
+    process' listener thread writes it to the handlers named in ``handlers``. When the queue
+    is full the record is dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        logging.Handler.__init__(self)
+        self.queue = None
+        self.target_handlers = [_get_handler(name) for name in handlers]
+        self.queue_size = queue_size
+
+    def enqueue(self, record):
+        record.log_handlers = self.target_handlers
+        log_queue = _get_queue(self.queue_size)
+        try:
+            log_queue.put_nowait(record)
+        except queue.Full:
+            with _process_lock:
+                _process["dropped"] += 1
+            return
+
+        if _process["dropped"] != _process["reported"]:
+            self._report_drops(record, log_queue)
+
+    def _report_drops(self, record, log_queue):
+        # Once there is room again, say how many records were lost
+        with _process_lock:
+            count = _process["dropped"] - _process["reported"]
+            _process["reported"] = _process["dropped"]
+        if count <= 0:
+            return
+        message = f"{count} log records dropped, the log queue was full"
+        warning = logging.LogRecord(record.name, logging.WARNING, __file__, 0, message, None, None)
+        warning.log_handlers = self.target_handlers
+        try:
+            log_queue.put_nowait(warning)
+        except queue.Full:
+            pass
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Drains the queue in batches and hands each target handler all of its records at once."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue, respect_handler_level=True)
+
+    def stop(self):
+        """Write the queued records and stop the thread; safe to call more than once."""
+        if self._thread is not None:
+            super().stop()
+
+    def _monitor(self):
+        log_queue = self.queue
+        stop = False
+        while not stop:
+            batch = [self.dequeue(True)]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+
+            records = []
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    records.append(record)
+                log_queue.task_done()
+            self.handle_batch(records)
+
+    def handle_batch(self, records):
+        by_handler = {}
+        for record in records:
+            for handler in getattr(record, "log_handlers", ()):
+                if record.levelno >= handler.level and handler.filter(record):
+                    by_handler.setdefault(handler, []).append(record)
+
+        for handler, handler_records in by_handler.items():
+            if isinstance(handler, InterProcessRotatingFileHandler):
+                handler.emit_batch(handler_records)
+            else:
+                for record in handler_records:
+                    handler.emit(record)
+
+
+class InterProcessRotatingFileHandler(NamedHandlerMixin, logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that several processes (and handlers) can share a file with: writes and
+    rollovers happen under an exclusive lock on ``<filename>.lock``, and a handler whose file was
+    rotated by another process reopens the new file before writing.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock_filename = f"{self.baseFilename}.lock"
+
+    def _lock(self):
+        lock_file = open(self.lock_filename, "a")
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            self.stream = self._open()
+            return
+        try:
+            rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        self.emit_batch([record])
+
+    def emit_batch(self, records):
+        """Write the records with a single lock, rollover check per record and one flush."""
+        self.acquire()
+        lock_file = None
+        try:
+            lock_file = self._lock()
+            self._reopen_if_rotated()
+            self.stream.seek(0, 2)
+            size = self.stream.tell()
+            for record in records:
+                try:
+                    message = self.format(record) + self.terminator
+                    if self.maxBytes > 0 and size + len(message) >= self.maxBytes and size > 0:
+                        self.doRollover()
+                        if self.stream is None:  # delay=True leaves the new file closed
+                            self.stream = self._open()
+                        size = 0
+                    self.stream.write(message)
+                    size += len(message)
+                except Exception:
+                    self.handleError(record)
+            self.stream.flush()
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+            self.release()
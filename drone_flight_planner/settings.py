@@ -63,6 +63,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "drone_flight_planner.custom_middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -173,13 +174,27 @@ FORMATTERS = [
     },
 ]
 
+# Loggers only enqueue records (LOG_QUEUE_SIZE at most, extra records are dropped and counted),
+# one listener thread per process writes them to the console and file handlers
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
 HANDLERS = {
+    "info_queue": {
+        "class": "drone_flight_planner.log_handlers.QueuedHandler",
+        "handlers": ["console_handler", "info_handler"],
+        "queue_size": LOG_QUEUE_SIZE,
+    },
+    "error_queue": {
+        "class": "drone_flight_planner.log_handlers.QueuedHandler",
+        "handlers": ["error_handler"],
+        "queue_size": LOG_QUEUE_SIZE,
+    },
     "console_handler": {
-        "class": "logging.StreamHandler",
+        "class": "drone_flight_planner.log_handlers.ConsoleHandler",
         "formatter": "simple",
     },
     "error_handler": {
-        "class": "logging.handlers.RotatingFileHandler",
+        "class": "drone_flight_planner.log_handlers.InterProcessRotatingFileHandler",
         "filename": f"{BASE_DIR}/logs/log.log",
         "mode": "a",
         "encoding": "utf-8",
@@ -188,7 +203,7 @@ HANDLERS = {
         "maxBytes": 1024 * 1024 * 5,
     },
     "info_handler": {
-        "class": "logging.handlers.RotatingFileHandler",
+        "class": "drone_flight_planner.log_handlers.InterProcessRotatingFileHandler",
         "filename": f"{BASE_DIR}/logs/log.log",
         "mode": "a",
         "formatter": "verbose",
@@ -200,12 +215,12 @@ HANDLERS = {
 LOGGERS = [
     {
         "info": {
-            "handlers": ["console_handler", "info_handler"],
+            "handlers": ["info_queue"],
             "level": "DEBUG",
             "propagate": True,
         },
         "error": {
-            "handlers": ["error_handler"],
+            "handlers": ["error_queue"],
             "level": "WARNING",
             "propagate": True,
         },
@@ -225,3 +240,84 @@ AUTH_USER_MODEL = "accounts_engine.CustomUser"
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+
+# Waypoint planner: "scanline" only generates the sweep segments covering the polygon,
+# "grid" generates the whole bounding box grid and filters it afterwards,
+# "local" plans in meters in a local projection of the polygon,
+# "optimized" plans like "local" along the sweep angle that minimizes WAYPOINT_SWEEP_OBJECTIVE,
+# "cells" plans like "optimized" one boustrophedon cell at a time (best for concave fields).
+WAYPOINT_PLANNING_MODE = os.getenv("WAYPOINT_PLANNING_MODE", "scanline")
+WAYPOINT_SWEEP_OBJECTIVE = os.getenv("WAYPOINT_SWEEP_OBJECTIVE", "lines")  # lines or length
+WAYPOINT_SWEEP_SEARCH_SECONDS = float(os.getenv("WAYPOINT_SWEEP_SEARCH_SECONDS", "0.05"))
+# In-process LRU of recent plans (per worker), backed by the plan_key of saved flight paths
+WAYPOINT_PLAN_CACHE_ENTRIES = int(os.getenv("WAYPOINT_PLAN_CACHE_ENTRIES", "128"))
+WAYPOINT_PLAN_CACHE_MAX_POINTS = int(os.getenv("WAYPOINT_PLAN_CACHE_MAX_POINTS", "5000000"))
+# Surveys estimated above this many waypoints are queued (202) and planned by run_planning_worker, 0 disables
+WAYPOINT_ASYNC_MIN_POINTS = int(os.getenv("WAYPOINT_ASYNC_MIN_POINTS", "500000"))
+WAYPOINT_WORKER_POLL_SECONDS = float(os.getenv("WAYPOINT_WORKER_POLL_SECONDS", "2"))
+# Running jobs without a worker heartbeat for this long are requeued, the worker beats every third of it
+WAYPOINT_JOB_TIMEOUT_SECONDS = int(os.getenv("WAYPOINT_JOB_TIMEOUT_SECONDS", "1800"))
+# Batch planning: process pool size (0 uses every core) and maximum flight paths per request
+WAYPOINT_BATCH_WORKERS = int(os.getenv("WAYPOINT_BATCH_WORKERS", "0"))
+WAYPOINT_BATCH_MAX_ITEMS = int(os.getenv("WAYPOINT_BATCH_MAX_ITEMS", "500"))
+# Waypoint storage: float64 (lossless, zero-copy reads) or delta (fixed-point to ~1 mm, compressed)
+WAYPOINT_STORAGE_FORMAT = os.getenv("WAYPOINT_STORAGE_FORMAT", "float64")
+# Spatial indexes kept in memory for bounding-box queries on retrieve
+WAYPOINT_INDEX_CACHE_ENTRIES = int(os.getenv("WAYPOINT_INDEX_CACHE_ENTRIES", "32"))
+# Route previews (GET /generate_waypoints/<id>/preview/): render threads, image cache size and waypoints drawn
+WAYPOINT_PREVIEW_WORKERS = int(os.getenv("WAYPOINT_PREVIEW_WORKERS", "2"))
+WAYPOINT_PREVIEW_CACHE_BYTES = int(os.getenv("WAYPOINT_PREVIEW_CACHE_BYTES", str(64 * 1024 * 1024)))
+WAYPOINT_PREVIEW_MAX_POINTS = int(os.getenv("WAYPOINT_PREVIEW_MAX_POINTS", "5000"))
+WAYPOINT_PREVIEW_TIMEOUT_SECONDS = float(os.getenv("WAYPOINT_PREVIEW_TIMEOUT_SECONDS", "30"))
+# Import the planning libraries at startup (e.g. with gunicorn --preload) instead of on first use
+WAYPOINT_PREWARM_PLANNER = os.getenv("WAYPOINT_PREWARM_PLANNER", "False") == "True"
+# Planning logs one summary per stage; set N > 0 to also trace every N-th computed point at DEBUG level
+WAYPOINT_LOG_SAMPLE_EVERY = int(os.getenv("WAYPOINT_LOG_SAMPLE_EVERY", "0"))
+# Per-stage timings as a Server-Timing header and histograms at GET /generate_waypoints/metrics/ (per process)
+WAYPOINT_METRICS_ENABLED = os.getenv("WAYPOINT_METRICS_ENABLED", "True") == "True"
+# Opt-in profiling of create requests by admins ("X-Profile: true" header or a sample rate),
+# see waypoint_generator/profiling.py
+WAYPOINT_PROFILE_ENABLED = os.getenv("WAYPOINT_PROFILE_ENABLED", "False") == "True"
+WAYPOINT_PROFILE_SAMPLE_RATE = float(os.getenv("WAYPOINT_PROFILE_SAMPLE_RATE", "0"))
+WAYPOINT_PROFILE_DIR = os.getenv("WAYPOINT_PROFILE_DIR", f"{BASE_DIR}/profiles")
+WAYPOINT_PROFILE_MAX_ENTRIES = int(os.getenv("WAYPOINT_PROFILE_MAX_ENTRIES", "20"))
+# Logged-out tokens are checked against an in-process set refreshed from the database every N seconds
+# (a logout in another process takes effect within N seconds); 0 looks every token up in the database
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "5"))
+# Expired logged-out tokens are deleted in batches by a background thread every N seconds (0 = off, then run
+# "manage.py purge_invalidated_tokens" from cron)
+TOKEN_PURGE_INTERVAL_SECONDS = float(os.getenv("TOKEN_PURGE_INTERVAL_SECONDS", "600"))
+TOKEN_PURGE_BATCH_SIZE = int(os.getenv("TOKEN_PURGE_BATCH_SIZE", "10000"))
+# Users of JWT requests are cached in process for N seconds (0 = query the database per request); every
+# REVALIDATE_SECONDS the cached users changed, deactivated or deleted in another process are dropped
+AUTH_USER_CACHE_SECONDS = float(os.getenv("AUTH_USER_CACHE_SECONDS", "30"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+AUTH_USER_CACHE_REVALIDATE_SECONDS = float(os.getenv("AUTH_USER_CACHE_REVALIDATE_SECONDS", "5"))
+# Base URL of a server with the paths of the Twilio REST API used instead of api.twilio.com, e.g. the local fake
+# server of benchmarks/fake_sms_server.py (empty = Twilio)
+SMS_API_BASE_URL = os.getenv("SMS_API_BASE_URL", "")
+# SMS are sent through one client per process: twilio, or stub (sends nothing, for tests and load runs)
+SMS_BACKEND = os.getenv("SMS_BACKEND", "twilio")
+# Keep-alive connections to the SMS API, requests running at once and seconds before a request times out
+SMS_MAX_CONNECTIONS = int(os.getenv("SMS_MAX_CONNECTIONS", "10"))
+SMS_MAX_CONCURRENCY = int(os.getenv("SMS_MAX_CONCURRENCY", "10"))
+SMS_TIMEOUT_SECONDS = float(os.getenv("SMS_TIMEOUT_SECONDS", "10"))
+SMS_STUB_LATENCY_SECONDS = float(os.getenv("SMS_STUB_LATENCY_SECONDS", "0"))
+# Delivery status of sent OTPs: checked N seconds after sending and again every N seconds until final, by one
+# thread per process, in batches; at most SMS_STATUS_MAX_PENDING messages wait, more are not tracked
+SMS_STATUS_DELAY_SECONDS = float(os.getenv("SMS_STATUS_DELAY_SECONDS", "30"))
+SMS_STATUS_BATCH_SIZE = int(os.getenv("SMS_STATUS_BATCH_SIZE", "100"))
+SMS_STATUS_MAX_PENDING = int(os.getenv("SMS_STATUS_MAX_PENDING", "10000"))
+SMS_STATUS_MAX_ATTEMPTS = int(os.getenv("SMS_STATUS_MAX_ATTEMPTS", "3"))
+# OTP SMS are written to an outbox in the request's transaction and sent by a dispatcher thread started with every
+# web process (wsgi.py/asgi.py), or by "manage.py run_otp_dispatcher" when OTP_DISPATCH_IN_PROCESS is False
+OTP_DISPATCH_IN_PROCESS = os.getenv("OTP_DISPATCH_IN_PROCESS", "True") == "True"
+OTP_DISPATCH_WORKERS = int(os.getenv("OTP_DISPATCH_WORKERS", "8"))
+OTP_DISPATCH_POLL_SECONDS = float(os.getenv("OTP_DISPATCH_POLL_SECONDS", "5"))
+# SMS sent per second by each dispatcher (0 = no limit)
+OTP_SEND_RATE = float(os.getenv("OTP_SEND_RATE", "10"))
+OTP_SEND_MAX_ATTEMPTS = int(os.getenv("OTP_SEND_MAX_ATTEMPTS", "5"))
+# Wait before the first retry of a failed send, doubled on every further attempt
+OTP_SEND_RETRY_SECONDS = float(os.getenv("OTP_SEND_RETRY_SECONDS", "2"))
+# Messages left "sending" this long by a dispatcher that died are sent again
+OTP_SEND_TIMEOUT_SECONDS = float(os.getenv("OTP_SEND_TIMEOUT_SECONDS", "60"))
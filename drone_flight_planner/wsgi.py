@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drone_flight_planner.settings")
 
 application = get_wsgi_application()
+
+# Send the due OTP SMS (retries, messages left by a stopped process) without waiting for an OTP request
+from accounts_engine.outbox import dispatcher  # noqa: E402
+
+dispatcher.start()
@@ -13,3 +13,7 @@ class Camera(ABC):
     @abstractmethod
     def get_fov(self, height):
         pass
+
+    def cache_key(self):
+        # Camera model and its optics, anything that changes the footprint changes the plan
+        return [type(self).__name__, sorted(vars(self).items())]
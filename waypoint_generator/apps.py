@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class WaypointGeneratorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "waypoint_generator"
+
+    def ready(self):
+        from django.conf import settings
+
+        # Web workers load the geometry libraries on the first planning request unless told otherwise
+        if settings.WAYPOINT_PREWARM_PLANNER:
+            from waypoint_generator.planner import warm_up
+
+            warm_up()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+COORDINATE_DECIMALS = 9  # ~0.1 mm, equal fields always hash the same
+
+
+def normalize_polygon(polygon):
+    """
+    Canonical vertex list of a decimal polygon: numeric, rounded, without the closing point,
+    counter-clockwise and starting from the smallest (latitude, longitude) vertex.
+    """
+    vertices = [
+        (round(float(point["latitude"]), COORDINATE_DECIMALS), round(float(point["longitude"]), COORDINATE_DECIMALS))
+        for point in polygon
+    ]
+    if len(vertices) > 1 and vertices[0] == vertices[-1]:
+        vertices = vertices[:-1]
+    if not vertices:
+        return vertices
+
+    # Shoelace area in (longitude, latitude) space, negative for clockwise rings
+    area = sum(vertices[i - 1][1] * vertices[i][0] - vertices[i][1] * vertices[i - 1][0] for i in range(len(vertices)))
+    if area < 0:
+        vertices.reverse()
+
+    start = vertices.index(min(vertices))
+    return vertices[start:] + vertices[:start]
+
+
+def plan_key(polygon, altitude, overlapping_percentage, camera, mode, **options):
+    """Content hash identifying a flight plan: same inputs, same waypoints."""
+    payload = {
+        "polygon": normalize_polygon(polygon),
+        "altitude": float(altitude),
+        "overlapping_percentage": float(overlapping_percentage),
+        "camera": camera.cache_key(),
+        "mode": mode,
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class PlanCache:
+    """
+    Bounded in-process LRU of planned waypoints, stored as read-only (latitudes, longitudes)
+    arrays, with an optional second tier supplied by the caller (e.g. earlier ``FlightPath`` rows).
+
+    Concurrent requests for the same key are coalesced: the first one computes the plan and
+    the others wait for its result.
+    """
+
+    def __init__(self, max_entries=128, max_points=5000000):
+        self.max_entries = max_entries
+        self.max_points = max_points
+        self._entries = OrderedDict()
+        self._points = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.database_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, latitudes, longitudes):
+        latitudes = np.array(latitudes, dtype=float)
+        longitudes = np.array(longitudes, dtype=float)
+        latitudes.flags.writeable = False
+        longitudes.flags.writeable = False
+        entry = (latitudes, longitudes)
+        if latitudes.size > self.max_points or self.max_entries <= 0:
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._points -= previous[0].size
+            self._entries[key] = entry
+            self._points += latitudes.size
+            while len(self._entries) > self.max_entries or self._points > self.max_points:
+                _, evicted = self._entries.popitem(last=False)
+                self._points -= evicted[0].size
+        return entry
+
+    def get_or_compute(self, key, compute, load=None):
+        """
+        Return the (latitudes, longitudes) of ``key``, trying memory, then ``load()`` and
+        finally ``compute()``. ``load`` returns None when its tier has no entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            waiter = self._in_flight.get(key)
+            leader = waiter is None
+            if leader:
+                waiter = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return waiter.result()
+
+        try:
+            result = load() if load is not None else None
+            with self._lock:
+                if result is not None:
+                    self.database_hits += 1
+                else:
+                    self.misses += 1
+            if result is None:
+                result = compute()
+
+            entry = self.put(key, *result)
+            waiter.set_result(entry)
+            return entry
+        except Exception as e:
+            waiter.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._points = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "points": self._points,
+                "hits": self.hits,
+                "database_hits": self.database_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
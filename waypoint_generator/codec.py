@@ -0,0 +1,64 @@
+import struct
+import zlib
+
+import numpy as np
+
+FLOAT64 = "float64"
+DELTA = "delta"
+
+STORAGE_FORMATS = (FLOAT64, DELTA)
+
+DELTA_DECIMALS = 8  # Fixed-point resolution of the delta format, ~1 mm
+
+# magic, format, decimals, padding, waypoint count: 16 bytes so the float64 body stays 8-byte aligned
+_HEADER = struct.Struct("<2sBB4xQ")
+_MAGIC = b"WP"
+_FORMAT_CODES = {FLOAT64: 1, DELTA: 2}
+_FORMAT_NAMES = {code: name for name, code in _FORMAT_CODES.items()}
+
+
+def encode_waypoints(latitudes, longitudes, storage_format=FLOAT64):
+    """
+    Pack waypoints into a binary blob.
+
+    ``float64`` stores the latitudes then the longitudes as little-endian doubles, lossless and
+    readable without copying. ``delta`` rounds to ``DELTA_DECIMALS`` decimals and zlib-compresses
+    the differences between consecutive points, which are nearly constant along sweep lines.
+    """
+    latitudes = np.asarray(latitudes, dtype="<f8")
+    longitudes = np.asarray(longitudes, dtype="<f8")
+    if storage_format not in _FORMAT_CODES:
+        raise ValueError(f"Unknown waypoint storage format: {storage_format}")
+
+    decimals = DELTA_DECIMALS if storage_format == DELTA else 0
+    header = _HEADER.pack(_MAGIC, _FORMAT_CODES[storage_format], decimals, latitudes.size)
+    if storage_format == FLOAT64:
+        return header + latitudes.tobytes() + longitudes.tobytes()
+
+    scale = 10.0**decimals
+    fixed = np.rint(np.concatenate((latitudes, longitudes)) * scale).astype("<i8")
+    return header + zlib.compress(np.diff(fixed, prepend=0).astype("<i8").tobytes())
+
+
+def decode_waypoints(data):
+    """
+    (latitudes, longitudes) of a blob from ``encode_waypoints``. ``float64`` blobs are returned as
+    read-only views of ``data`` (bytes or the memoryview the database driver returns).
+    """
+    buffer = memoryview(data)
+    magic, code, decimals, count = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC or code not in _FORMAT_NAMES:
+        raise ValueError("Not an encoded waypoint blob.")
+
+    if _FORMAT_NAMES[code] == FLOAT64:
+        values = np.frombuffer(buffer, dtype="<f8", count=2 * count, offset=_HEADER.size)
+    else:
+        payload_start = _HEADER.size
+        deltas = np.frombuffer(zlib.decompress(buffer[payload_start:]), dtype="<i8")
+        values = np.cumsum(deltas) / 10.0**decimals
+        values.flags.writeable = False
+    return values[:count], values[count:]
+
+
+def waypoint_count(data):
+    return _HEADER.unpack_from(memoryview(data))[3]
@@ -0,0 +1,171 @@
+import numpy as np
+
+from waypoint_generator.scanline import cover_lattice, sweep_intervals
+
+
+class Cell:
+    """
+    One boustrophedon cell: a run of consecutive sweep lines that each cross the cell in a
+    single segment, so it can be covered back and forth without leaving it.
+    """
+
+    def __init__(self):
+        self.columns = []
+        self.firsts = []
+        self.counts = []
+
+    def add(self, column, first, count):
+        self.columns.append(column)
+        self.firsts.append(first)
+        self.counts.append(count)
+
+    @property
+    def point_count(self):
+        return sum(self.counts)
+
+    def variants(self):
+        # (reverse_columns, start_up) for the four ways of sweeping the cell
+        return ((False, True), (False, False), (True, True), (True, False))
+
+    def endpoints(self, reverse_columns, start_up):
+        """(entry, exit) as (column, row) lattice indexes when swept with the given variant."""
+        order = list(range(len(self.columns)))
+        if reverse_columns:
+            order.reverse()
+        first, last = order[0], order[-1]
+        end_up = start_up if (len(order) - 1) % 2 == 0 else not start_up
+
+        entry_row = self.firsts[first] if start_up else self.firsts[first] + self.counts[first] - 1
+        exit_row = self.firsts[last] + self.counts[last] - 1 if end_up else self.firsts[last]
+        return (self.columns[first], entry_row), (self.columns[last], exit_row)
+
+    def task(self, reverse_columns, start_up):
+        columns = np.array(self.columns)
+        firsts = np.array(self.firsts)
+        counts = np.array(self.counts)
+        if reverse_columns:
+            columns, firsts, counts = columns[::-1], firsts[::-1], counts[::-1]
+        descending = np.arange(columns.size) % 2 == (0 if not start_up else 1)
+        return columns, firsts, counts, descending
+
+
+def decompose(rows, columns, area):
+    """
+    Boustrophedon decomposition of ``area`` sampled on the sweep lines.
+
+    The covered segments of neighbouring sweep lines are linked when they share lattice rows;
+    a cell continues while the link is one-to-one and a new cell starts at every split or merge.
+    Returns the cells in sweep-line order.
+    """
+    column_index, low, high = sweep_intervals(columns, area)
+    firsts = np.searchsorted(rows, low, "right")
+    counts = np.searchsorted(rows, high, "left") - firsts
+    keep = counts > 0
+    column_index, firsts, counts = column_index[keep].tolist(), firsts[keep].tolist(), counts[keep].tolist()
+
+    segments_by_column = {}
+    for column, first, count in zip(column_index, firsts, counts):
+        segments_by_column.setdefault(column, []).append((first, count))
+
+    cells = []
+    previous_column, previous_segments, previous_cells = None, [], []
+    for column in sorted(segments_by_column):
+        segments = segments_by_column[column]
+        if previous_column is not None and column != previous_column + 1:
+            previous_segments, previous_cells = [], []
+
+        links = [
+            [i for i, (p_first, p_count) in enumerate(previous_segments) if _overlap(p_first, p_count, first, count)]
+            for first, count in segments
+        ]
+        links_back = [sum(i in link for link in links) for i in range(len(previous_segments))]
+
+        current_cells = []
+        for (first, count), link in zip(segments, links):
+            if len(link) == 1 and links_back[link[0]] == 1:
+                cell = previous_cells[link[0]]
+            else:
+                cell = Cell()
+                cells.append(cell)
+            cell.add(column, first, count)
+            current_cells.append(cell)
+
+        previous_column, previous_segments, previous_cells = column, segments, current_cells
+    return cells
+
+
+def _overlap(first_a, count_a, first_b, count_b):
+    return first_a < first_b + count_b and first_b < first_a + count_a
+
+
+def chain_cells(cells, rows, columns):
+    """
+    Greedy nearest-neighbour visiting order: starting from the first cell swept like the
+    default planner, repeatedly fly to the closest entry point of an unvisited cell.
+    Returns a list of (cell, reverse_columns, start_up).
+    """
+    if not cells:
+        return []
+
+    variants = cells[0].variants()
+    # (x, y) of the entry and exit point of every cell swept with every variant
+    entries = np.empty((len(cells), len(variants), 2))
+    exits = np.empty_like(entries)
+    for index, cell in enumerate(cells):
+        for variant_index, variant in enumerate(variants):
+            (entry_column, entry_row), (exit_column, exit_row) = cell.endpoints(*variant)
+            entries[index, variant_index] = columns[entry_column], rows[entry_row]
+            exits[index, variant_index] = columns[exit_column], rows[exit_row]
+
+    route = [(cells[0], *variants[0])]
+    current = exits[0, 0]
+    visited = np.zeros(len(cells), dtype=bool)
+    visited[0] = True
+    for _ in range(len(cells) - 1):
+        distances = np.hypot(entries[..., 0] - current[0], entries[..., 1] - current[1])
+        distances[visited] = np.inf
+        # Ties go to the first cell and variant, like the loop over the remaining cells did
+        index, variant_index = np.unravel_index(np.argmin(distances), distances.shape)
+        visited[index] = True
+        route.append((cells[index], *variants[variant_index]))
+        current = exits[index, variant_index]
+    return route
+
+
+def plan_cells(rows, columns, tasks):
+    """Waypoints of a batch of cell tasks as (rows, columns) arrays, in task order."""
+    plans = [_plan_cell(rows, columns, *task) for task in tasks]
+    if not plans:
+        return np.empty(0), np.empty(0)
+    return np.concatenate([plan[0] for plan in plans]), np.concatenate([plan[1] for plan in plans])
+
+
+def _plan_cell(rows, columns, cell_columns, firsts, counts, descending):
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    local = np.arange(offsets.size) - offsets
+    row = np.where(
+        np.repeat(descending, counts),
+        np.repeat(firsts + counts - 1, counts) - local,
+        np.repeat(firsts, counts) + local,
+    )
+    return rows[row], columns[np.repeat(cell_columns, counts)]
+
+
+def generate_cell_grid(rows, columns, area, margin):
+    """
+    Cover ``area`` grown by ``margin`` one boustrophedon cell at a time and chain the cells.
+    Returns (rows, columns) arrays like ``cover_lattice``.
+    """
+    rows = np.asarray(rows, dtype=float)
+    columns = np.asarray(columns, dtype=float)
+    if rows.size == 0 or columns.size == 0:
+        return np.empty(0), np.empty(0)
+    if not area.is_valid:
+        return cover_lattice(rows, columns, area, margin)
+
+    if margin:
+        area = area.buffer(margin)
+    cells = decompose(rows, columns, area)
+    route = chain_cells(cells, rows, columns)
+    tasks = [cell.task(reverse_columns, start_up) for cell, reverse_columns, start_up in route]
+    return plan_cells(rows, columns, tasks)
@@ -0,0 +1,50 @@
+import numpy as np
+
+# shapely is imported where it is used: loading it costs every process that only imports the views
+
+
+def average_step(latitudes, longitudes):
+    """Mean planar distance (in degrees) between consecutive points, as ``calculate_average_distance``."""
+    if len(latitudes) < 2:
+        return 0
+    return float(np.hypot(np.diff(latitudes), np.diff(longitudes)).mean())
+
+
+def build_polygon(polygon_coords):
+    from shapely.geometry import Polygon
+
+    return Polygon([(p["longitude"], p["latitude"]) for p in polygon_coords])
+
+
+class SurveyArea:
+    """
+    The user polygon and its "just outside" margin, built and prepared once so that
+    every candidate waypoint can be tested with a single vectorized call.
+    """
+
+    def __init__(self, polygon, buffer_distance):
+        import shapely
+
+        self.polygon = polygon
+        self.buffered = self.polygon.buffer(buffer_distance) if buffer_distance else self.polygon
+        shapely.prepare(self.polygon)
+        shapely.prepare(self.buffered)
+
+    def contains_mask(self, latitudes, longitudes):
+        """Boolean mask of the points inside the polygon or just outside it."""
+        import shapely
+
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        mask = shapely.contains_xy(self.polygon, longitudes, latitudes)
+
+        outside = ~mask
+        if self.buffered is not self.polygon and outside.any():
+            mask[outside] = shapely.contains_xy(self.buffered, longitudes[outside], latitudes[outside])
+        return mask
+
+
+def filter_mask(latitudes, longitudes, polygon_coords, buffer_distance=None):
+    if buffer_distance is None:
+        buffer_distance = average_step(latitudes, longitudes)
+    return SurveyArea(build_polygon(polygon_coords), buffer_distance).contains_mask(latitudes, longitudes)
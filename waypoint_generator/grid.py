@@ -0,0 +1,181 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371e3  # Earth radius in meters
+
+
+def destination_point(lat, lon, distance, bearing):
+    """
+    Vectorized great-circle destination point, same formula as ``vertical_move_point``.
+    Accepts scalars or arrays in degrees/meters and returns (lat, lon) in degrees.
+    """
+    bearing = np.radians(bearing)
+    lat1 = np.radians(lat)
+    lon1 = np.radians(lon)
+    angular_distance = np.asarray(distance, dtype=float) / EARTH_RADIUS
+
+    lat2 = np.arcsin(
+        np.sin(lat1) * np.cos(angular_distance) + np.cos(lat1) * np.sin(angular_distance) * np.cos(bearing)
+    )
+    lon2 = lon1 + np.arctan2(
+        np.sin(bearing) * np.sin(angular_distance) * np.cos(lat1),
+        np.cos(angular_distance) - np.sin(lat1) * np.sin(lat2),
+    )
+    return np.degrees(lat2), np.degrees(lon2)
+
+
+def sweep_spacing(coverage, overlapping_percentage):
+    """Return (move_distance, start_move) in meters for one camera axis."""
+    overlap_distance = coverage * (overlapping_percentage / 100)
+    move_distance = coverage - overlap_distance
+    start_move = -(move_distance - abs((coverage / 2) - overlap_distance))
+    return move_distance, start_move
+
+
+def bounding_box_limits(polygon):
+    lats = [point["latitude"] for point in polygon]
+    lons = [point["longitude"] for point in polygon]
+    return min(lats), max(lats), min(lons), max(lons)
+
+
+def _start_point(min_lat, max_lon, start_move):
+    # Start from the right-bottom corner shifted by start_move south and east
+    lat, lon = destination_point(min_lat, max_lon, start_move, 0)
+    lat, lon = destination_point(lat, lon, start_move, 270)
+    return float(lat), float(lon)
+
+
+def vertical_axis(polygon, overlapping_percentage, coverage_vertical):
+    """
+    Closed form of the ``generate_vertical_waypoints`` loop.
+    Moving due north keeps the longitude fixed and advances the latitude by a
+    constant angle, so point k is simply ``start + k * step``.
+    """
+    move_distance, start_move = sweep_spacing(coverage_vertical, overlapping_percentage)
+    min_lat, max_lat, min_lon, max_lon = bounding_box_limits(polygon)
+    begin_lat, begin_lon = _start_point(min_lat, max_lon, start_move)
+    end_lat = math.degrees(math.radians(max_lat) + move_distance / EARTH_RADIUS)
+
+    step = move_distance / EARTH_RADIUS
+    if step <= 0 or begin_lat > end_lat:
+        return np.empty(0), np.empty(0)
+
+    count = int((math.radians(end_lat) - math.radians(begin_lat)) / step) + 2
+    latitudes = np.degrees(math.radians(begin_lat) + step * np.arange(count))
+    latitudes = latitudes[latitudes <= end_lat]
+    return latitudes, np.full(latitudes.shape, begin_lon)
+
+
+def _westward_track(lat, lon, step, count):
+    # Repeated great-circle steps at bearing 270 satisfy sin(lat_k) = sin(lat_0) * cos(step) ** k,
+    # so every latitude (and therefore every longitude increment) is known up front.
+    lat_rad = np.arcsin(math.sin(math.radians(lat)) * math.cos(step) ** np.arange(count))
+    sin_lat = np.sin(lat_rad)
+    increments = np.arctan2(
+        -math.sin(step) * np.cos(lat_rad[:-1]),
+        math.cos(step) - sin_lat[:-1] * sin_lat[1:],
+    )
+    lon_rad = math.radians(lon) + np.concatenate(([0.0], np.cumsum(increments)))
+    return np.degrees(lat_rad), np.degrees(lon_rad)
+
+
+def horizontal_axis(polygon, overlapping_percentage, coverage_horizontal):
+    """Closed form of the ``generate_horizontal_waypoints`` loop."""
+    move_distance, start_move = sweep_spacing(coverage_horizontal, overlapping_percentage)
+    min_lat, max_lat, min_lon, max_lon = bounding_box_limits(polygon)
+    start_lat, start_lon = _start_point(min_lat, max_lon, start_move)
+    _, end_lon = destination_point(min_lat, min_lon, move_distance, 270)
+    end_lon = float(end_lon)
+
+    step = move_distance / EARTH_RADIUS
+    if step <= 0 or start_lon <= end_lon:
+        return np.empty(0), np.empty(0)
+
+    first_increment = abs(float(destination_point(start_lat, start_lon, move_distance, 270)[1]) - start_lon)
+    count = int((start_lon - end_lon) / first_increment) + 2
+    while True:
+        latitudes, longitudes = _westward_track(start_lat, start_lon, step, count)
+        if longitudes[-1] <= end_lon:
+            break
+        count *= 2
+
+    # Longitudes decrease monotonically, keep everything before the first one past the edge
+    keep = int(np.argmax(longitudes <= end_lon))
+    return latitudes[:keep], longitudes[:keep]
+
+
+def planar_axes(min_x, max_x, min_y, max_y, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """
+    Sweep axes in a planar metric frame (x east, y north), laid out like the geodetic ones:
+    rows start south of the bounding box and run north, columns start east of it and run west.
+    Returns (rows, columns) arrays in meters.
+    """
+    row_step, row_start = sweep_spacing(coverage_vertical, overlapping_percentage)
+    column_step, column_start = sweep_spacing(coverage_horizontal, overlapping_percentage)
+    if row_step <= 0 or column_step <= 0:
+        return np.empty(0), np.empty(0)
+
+    first_row = min_y + row_start
+    last_row = max_y + row_step
+    rows = first_row + row_step * np.arange(max(int((last_row - first_row) / row_step) + 2, 0))
+    rows = rows[rows <= last_row]
+
+    first_column = max_x - column_start
+    last_column = min_x - column_step
+    columns = first_column - column_step * np.arange(max(int((first_column - last_column) / column_step) + 2, 0))
+    columns = columns[columns > last_column]
+    return rows, columns
+
+
+def serpentine_grid(latitudes, longitudes):
+    """
+    Lay the sweep lines out in the serpentine order of ``generate_all_points``:
+    the first column runs south to north, the next north to south, and so on.
+    Returns flat (latitudes, longitudes) arrays.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    if latitudes.size == 0 or longitudes.size == 0:
+        return np.empty(0), np.empty(0)
+
+    grid_latitudes = np.tile(latitudes, (longitudes.size, 1))
+    grid_latitudes[1::2] = latitudes[::-1]
+    grid_longitudes = np.repeat(longitudes, latitudes.size)
+    return grid_latitudes.ravel(), grid_longitudes
+
+
+def generate_grid(bounding_box, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """Full serpentine survey grid over the bounding box as (latitudes, longitudes) arrays."""
+    latitudes, _ = vertical_axis(bounding_box, overlapping_percentage, coverage_vertical)
+    _, longitudes = horizontal_axis(bounding_box, overlapping_percentage, coverage_horizontal)
+    return serpentine_grid(latitudes, longitudes)
+
+
+def grid_average_step(latitudes, longitudes):
+    """
+    Mean distance (in degrees) between consecutive points of ``serpentine_grid(latitudes, longitudes)``
+    without building the grid: inside a column only the latitude changes, and every column starts
+    at the latitude where the previous one ended.
+    """
+    point_count = len(latitudes) * len(longitudes)
+    if point_count < 2:
+        return 0
+    column_steps = np.abs(np.diff(latitudes)).sum() * len(longitudes)
+    row_steps = np.abs(np.diff(longitudes)).sum()
+    return float((column_steps + row_steps) / (point_count - 1))
+
+
+def to_waypoints(latitudes, longitudes):
+    return [
+        {"latitude": lat, "longitude": lon}
+        for lat, lon in zip(np.asarray(latitudes).tolist(), np.asarray(longitudes).tolist())
+    ]
+
+
+def from_waypoints(points):
+    if not points:
+        return np.empty(0), np.empty(0)
+    latitudes = np.fromiter((point["latitude"] for point in points), dtype=float, count=len(points))
+    longitudes = np.fromiter((point["longitude"] for point in points), dtype=float, count=len(points))
+    return latitudes, longitudes
@@ -0,0 +1,43 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from waypoint_generator.pipeline import claim_next_job, requeue_stale_jobs, run_planning_job
+from waypoint_generator.planner import warm_up
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+
+class Command(BaseCommand):
+    help = "Plan queued flight paths. Polls the database, so no message broker is needed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.WAYPOINT_WORKER_POLL_SECONDS,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+
+    def handle(self, *args, **options):
+        warm_up()
+        logger_info.info("Planning worker started")
+        while True:
+            requeued = requeue_stale_jobs(settings.WAYPOINT_JOB_TIMEOUT_SECONDS)
+            if requeued:
+                logger_error.warning(f"Requeued {requeued} stale planning jobs")
+
+            flight_path = claim_next_job()
+            if flight_path is not None:
+                run_planning_job(flight_path)
+                self.stdout.write(f"Flight path {flight_path.id}: {flight_path.status}")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,110 @@
+import json
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from rest_framework.renderers import BaseRenderer
+
+# Upper bounds of the histogram buckets, +Inf is implied
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+POINT_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Stages timed during the current request, None outside of ServerTimingMiddleware
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Prometheus histogram with one series per stage, kept in the memory of this process."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(stage)
+            if series is None:
+                series = self._series[stage] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {stage: (list(values["counts"]), values["sum"]) for stage, values in self._series.items()}
+
+        for stage, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{self.name}_count{{stage="{stage}"}} {cumulative}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+stage_duration = Histogram(
+    "waypoint_stage_duration_seconds", "Duration of the waypoint planning stages.", DURATION_BUCKETS
+)
+stage_points = Histogram("waypoint_stage_points", "Waypoints produced by the waypoint planning stages.", POINT_BUCKETS)
+
+
+def record_stage(name, seconds, points=None):
+    """Add a finished stage to the histograms and to the Server-Timing entries of the current request."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+    stage_duration.observe(name, seconds)
+    if points is not None:
+        stage_points.observe(name, points)
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stages recorded until the block ends, as a list of (name, seconds)."""
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings):
+    """``Server-Timing`` header value of (name, seconds) pairs, durations in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings)
+
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text exposition format."""
+    # Imported here, the log handlers belong to the project settings and not to this app
+    from drone_flight_planner.log_handlers import dropped_records
+
+    lines = stage_duration.render() + stage_points.render()
+    lines += [
+        "# HELP waypoint_log_records_dropped_total Log records dropped because the log queue was full.",
+        "# TYPE waypoint_log_records_dropped_total counter",
+        f"waypoint_log_records_dropped_total {dropped_records()}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # The metrics are sent as text, error bodies as JSON
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data).encode(self.charset)
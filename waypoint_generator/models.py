@@ -1,8 +1,23 @@
+from django.conf import settings
 from django.db import models
 from accounts_engine.models import BaseClass, CustomUser
 
+from waypoint_generator.codec import decode_waypoints, encode_waypoints, waypoint_count
+from waypoint_generator.grid import from_waypoints, to_waypoints
+
 
 class FlightPath(BaseClass):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="flightpaths")
     polygon_lat_lon = models.JSONField(
         help_text="List of latitude and longitude coordinates forming the closed " "polygon."
@@ -15,6 +30,65 @@ class FlightPath(BaseClass):
         null=True,
         blank=True,
     )
+    waypoints_data = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Generated waypoints packed by waypoint_generator.codec, used instead of waypoints when set.",
+    )
+    plan_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Content hash of the normalized polygon and planning parameters, used to reuse plans.",
+    )
+    planning_mode = models.CharField(max_length=20, null=True, blank=True, help_text="Waypoint planner mode.")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=DONE,
+        db_index=True,
+        help_text="Planning job status, large surveys are planned in the background.",
+    )
+    error_message = models.TextField(null=True, blank=True, help_text="Why the planning job failed.")
+    heartbeat_datetime = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Last time the planning worker running this job reported it alive.",
+    )
+
+    @staticmethod
+    def pack_waypoints(latitudes, longitudes):
+        return encode_waypoints(latitudes, longitudes, settings.WAYPOINT_STORAGE_FORMAT)
+
+    def set_waypoints(self, latitudes, longitudes):
+        """Store planned waypoints in the compact binary column."""
+        self.waypoints_data = self.pack_waypoints(latitudes, longitudes)
+        self.waypoints = None
+
+    @property
+    def waypoint_arrays(self):
+        """(latitudes, longitudes) arrays, decoded from the binary column without copying when possible."""
+        if self.waypoints_data is not None:
+            return decode_waypoints(self.waypoints_data)
+        if self.waypoints is not None:
+            return from_waypoints(self.waypoints)
+        return None
+
+    @property
+    def waypoint_list(self):
+        arrays = self.waypoint_arrays
+        return to_waypoints(*arrays) if arrays is not None else None
+
+    @property
+    def waypoint_count(self):
+        if self.waypoints_data is not None:
+            return waypoint_count(self.waypoints_data)
+        if self.waypoints is not None:
+            return len(self.waypoints)
+        return None
 
     def clean(self):
         if not isinstance(self.polygon_lat_lon, list) or len(self.polygon_lat_lon) < 3:
@@ -0,0 +1,260 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from waypoint_generator.cache import PlanCache, plan_key
+from waypoint_generator.models import FlightPath
+from waypoint_generator.planner import CELLS, OPTIMIZED, estimate_waypoint_count, plan_waypoints
+from waypoint_generator.services import GoProHero9Black
+from waypoint_generator.tracing import planning_stage
+from waypoint_generator.utils import convert_polygon_to_decimal
+
+logger = logging.getLogger(__name__)
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+plan_cache = PlanCache(
+    max_entries=settings.WAYPOINT_PLAN_CACHE_ENTRIES, max_points=settings.WAYPOINT_PLAN_CACHE_MAX_POINTS
+)
+
+
+def get_plan_options(planning_mode):
+    # Options that change the resulting waypoints, and therefore the plan key
+    if planning_mode in (OPTIMIZED, CELLS):
+        return {
+            "sweep_objective": settings.WAYPOINT_SWEEP_OBJECTIVE,
+            # The sweep angle search stops after this many seconds, a longer search may find a better angle
+            "search_budget": settings.WAYPOINT_SWEEP_SEARCH_SECONDS,
+        }
+    return {}
+
+
+def get_plan_key(polygon, altitude, overlapping_percentage, camera, planning_mode):
+    return plan_key(polygon, altitude, overlapping_percentage, camera, planning_mode, **get_plan_options(planning_mode))
+
+
+def get_plan_arguments(polygon, altitude, overlapping_percentage, camera, planning_mode):
+    # Positional and keyword arguments of plan_waypoints, plain values so they can be sent to another process
+    coverage_vertical, coverage_horizontal = camera.get_fov(altitude)
+    options = {
+        "mode": planning_mode,
+        "sweep_objective": settings.WAYPOINT_SWEEP_OBJECTIVE,
+        "search_budget": settings.WAYPOINT_SWEEP_SEARCH_SECONDS,
+    }
+    return (polygon, overlapping_percentage, coverage_vertical, coverage_horizontal), options
+
+
+def compute_plan(polygon, altitude, overlapping_percentage, camera, planning_mode):
+    args, options = get_plan_arguments(polygon, altitude, overlapping_percentage, camera, planning_mode)
+    return plan_waypoints(*args, **options)
+
+
+def estimate_plan_size(polygon, altitude, overlapping_percentage, camera):
+    coverage_vertical, coverage_horizontal = camera.get_fov(altitude)
+    return estimate_waypoint_count(polygon, overlapping_percentage, coverage_vertical, coverage_horizontal)
+
+
+def _saved_plans(keys):
+    # Planned flight paths of the given keys, oldest first; waypoints are in either column
+    return (
+        FlightPath.objects.filter(plan_key__in=keys)
+        .filter(Q(waypoints_data__isnull=False) | Q(waypoints__isnull=False))
+        .order_by("created_datetime")
+    )
+
+
+def load_saved_plan(key):
+    # Second cache tier: a flight path already planned with the same key
+    flight_path = _saved_plans([key]).only("waypoints", "waypoints_data").last()
+    if flight_path is None:
+        return None
+    return flight_path.waypoint_arrays
+
+
+def load_saved_plans(keys):
+    """Bulk version of ``load_saved_plan``: {key: (latitudes, longitudes)} for the keys already planned."""
+    saved = _saved_plans(keys).only("plan_key", "waypoints", "waypoints_data")
+    # Oldest first so the newest row of every key wins, like load_saved_plan
+    return {flight_path.plan_key: flight_path.waypoint_arrays for flight_path in saved}
+
+
+_process_pools = {}
+
+
+def get_process_pool(max_workers):
+    """Process pool of ``max_workers`` shared by every batch planned in this worker, created on first use."""
+    pool = _process_pools.get(max_workers)
+    if pool is None:
+        # spawn keeps the children free of the parent's threads, locks and DB connections
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        _process_pools[max_workers] = pool
+    return pool
+
+
+def get_batch_workers():
+    return settings.WAYPOINT_BATCH_WORKERS or os.cpu_count() or 1
+
+
+def plan_batch(jobs, camera, workers=None):
+    """
+    Plan many flight paths at once. ``jobs`` is a list of
+    (polygon, altitude, overlapping_percentage, planning_mode) tuples.
+
+    Plans already in the cache or the database are reused, identical jobs are planned once
+    and the rest are spread over a process pool of ``workers`` (default: every core).
+    Returns one (key, (latitudes, longitudes)) or (key, exception) per job, in order.
+    """
+    workers = workers or get_batch_workers()
+    with planning_stage("batch", items=len(jobs), workers=workers) as summary:
+        keys = [get_plan_key(*job[:3], camera, job[3]) for job in jobs]
+
+        results = {}
+        for key in keys:
+            entry = plan_cache.get(key)
+            if entry is not None:
+                results[key] = entry
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing:
+            for key, entry in load_saved_plans(missing).items():
+                results[key] = plan_cache.put(key, *entry)
+
+        pending = {}
+        for key, job in zip(keys, jobs):
+            if key not in results and key not in pending:
+                pending[key] = get_plan_arguments(*job[:3], camera, job[3])
+
+        if workers > 1 and len(pending) > 1:
+            pool = get_process_pool(workers)
+            futures = {key: pool.submit(plan_waypoints, *args, **options) for key, (args, options) in pending.items()}
+            outcomes = {}
+            for key, future in futures.items():
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    outcomes[key] = e
+        else:
+            outcomes = {}
+            for key, (args, options) in pending.items():
+                try:
+                    outcomes[key] = plan_waypoints(*args, **options)
+                except Exception as e:
+                    outcomes[key] = e
+
+        for key, outcome in outcomes.items():
+            if isinstance(outcome, Exception):
+                logger_error.error(f"Batch planning failed for plan {key}: {str(outcome)}")
+                results[key] = outcome
+            else:
+                results[key] = plan_cache.put(key, *outcome)
+        summary["reused"] = len(results) - len(outcomes)
+        summary["planned"] = len(outcomes)
+        summary["failed"] = sum(isinstance(outcome, Exception) for outcome in outcomes.values())
+    return [(key, results[key]) for key in keys]
+
+
+class JobHeartbeat:
+    """
+    Renews ``heartbeat_datetime`` of a running flight path every ``interval`` seconds from a
+    background thread, so requeue_stale_jobs can tell a long plan from a dead worker.
+    """
+
+    def __init__(self, flight_path_id, interval):
+        self.flight_path_id = flight_path_id
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="planning-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    FlightPath.objects.filter(id=self.flight_path_id, status=FlightPath.RUNNING).update(
+                        heartbeat_datetime=timezone.now()
+                    )
+                except Exception as e:
+                    logger_error.error(f"Heartbeat of flight path {self.flight_path_id} failed: {str(e)}")
+        finally:
+            # The thread has its own database connection
+            connection.close()
+
+
+def get_heartbeat_interval():
+    # Several heartbeats fit in the timeout, one late heartbeat does not requeue a running job
+    return max(settings.WAYPOINT_JOB_TIMEOUT_SECONDS / 3, 1)
+
+
+def run_planning_job(flight_path, camera=None):
+    """Plan a queued flight path in place and record whether it is done or failed."""
+    camera = camera or GoProHero9Black()
+    planning_mode = flight_path.planning_mode or settings.WAYPOINT_PLANNING_MODE
+    with JobHeartbeat(flight_path.id, get_heartbeat_interval()):
+        try:
+            polygon = convert_polygon_to_decimal(flight_path.polygon_lat_lon)
+            key = flight_path.plan_key or get_plan_key(
+                polygon, flight_path.altitude, flight_path.overlapping_percentage, camera, planning_mode
+            )
+            altitude, overlapping_percentage = flight_path.altitude, flight_path.overlapping_percentage
+            latitudes, longitudes = plan_cache.get_or_compute(
+                key,
+                lambda: compute_plan(polygon, altitude, overlapping_percentage, camera, planning_mode),
+                load=lambda: load_saved_plan(key),
+            )
+            flight_path.set_waypoints(latitudes, longitudes)
+            flight_path.plan_key = key
+            flight_path.status = FlightPath.DONE
+            flight_path.error_message = None
+            logger_info.info(f"Flight path {flight_path.id} planned with {len(latitudes)} waypoints")
+
+        except Exception as e:
+            flight_path.status = FlightPath.FAILED
+            flight_path.error_message = str(e)
+            logger_error.error(f"Flight path {flight_path.id} planning failed: {str(e)}")
+
+    flight_path.save(
+        update_fields=["waypoints", "waypoints_data", "plan_key", "status", "error_message", "updated_datetime"]
+    )
+    return flight_path
+
+
+def claim_next_job():
+    """Mark the oldest queued flight path as running and return it, None when the queue is empty."""
+    with transaction.atomic():
+        flight_path = (
+            FlightPath.objects.select_for_update(skip_locked=True)
+            .filter(status=FlightPath.QUEUED)
+            .order_by("created_datetime")
+            .first()
+        )
+        if flight_path is None:
+            return None
+        flight_path.status = FlightPath.RUNNING
+        flight_path.heartbeat_datetime = timezone.now()
+        flight_path.save(update_fields=["status", "heartbeat_datetime", "updated_datetime"])
+    return flight_path
+
+
+def requeue_stale_jobs(timeout):
+    # Jobs of a worker that died mid-plan stay "running" forever unless put back in the queue.
+    # A live worker renews the heartbeat while it plans, however long the plan takes.
+    cutoff = timezone.now() - timezone.timedelta(seconds=timeout)
+    return (
+        FlightPath.objects.filter(status=FlightPath.RUNNING)
+        .filter(Q(heartbeat_datetime__lt=cutoff) | Q(heartbeat_datetime__isnull=True, updated_datetime__lt=cutoff))
+        .update(status=FlightPath.QUEUED)
+    )
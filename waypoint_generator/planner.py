@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+
+from waypoint_generator.decomposition import generate_cell_grid
+from waypoint_generator.geometry import filter_mask
+from waypoint_generator.grid import generate_grid, sweep_spacing
+from waypoint_generator.projection import LocalProjection
+from waypoint_generator.scanline import cover_lattice, generate_scanline_grid
+from waypoint_generator.sweep_angle import LINES, NORTH_SOUTH, optimize_sweep_angle, rotate, rotated_lattice
+from waypoint_generator.tracing import extent, planning_stage
+
+GRID = "grid"
+SCANLINE = "scanline"
+LOCAL = "local"
+OPTIMIZED = "optimized"
+CELLS = "cells"
+
+PLANNING_MODES = (GRID, SCANLINE, LOCAL, OPTIMIZED, CELLS)
+
+
+def warm_up():
+    """Import the geometry libraries now, for processes that plan anyway (they are loaded on first use otherwise)."""
+    import shapely  # noqa: F401
+
+
+def generate_local_grid(
+    polygon,
+    overlapping_percentage,
+    coverage_vertical,
+    coverage_horizontal,
+    optimize_angle=False,
+    sweep_objective=LINES,
+    search_budget=0.05,
+    decompose=False,
+):
+    """
+    Plan in a local metric frame: the polygon is projected once, spacing, sweeping and the
+    "just outside" margin are all in meters, and the waypoints are converted back to
+    latitude/longitude in a single batched step.
+
+    With ``optimize_angle`` the sweep lines follow the direction found by ``optimize_sweep_angle``
+    instead of running north-south, and with ``decompose`` the polygon is covered one
+    boustrophedon cell at a time (see ``generate_cell_grid``).
+    """
+    projection = LocalProjection.for_polygon(polygon)
+    east, north = projection.project_polygon(polygon)
+
+    angle = NORTH_SOUTH
+    if optimize_angle:
+        with planning_stage("sweep_angle", objective=sweep_objective) as summary:
+            angle = optimize_sweep_angle(
+                east,
+                north,
+                overlapping_percentage,
+                coverage_vertical,
+                coverage_horizontal,
+                objective=sweep_objective,
+                time_budget=search_budget,
+            )
+            summary["degrees"] = round(math.degrees(angle), 2)
+
+    with planning_stage("cover", cells=decompose) as summary:
+        lattice = rotated_lattice(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal)
+        summary["sweep_lines"] = len(lattice[1])
+        if decompose:
+            rows, columns = generate_cell_grid(*lattice)
+        else:
+            rows, columns = cover_lattice(*lattice)
+        summary["points"] = len(rows)
+    east, north = rotate(columns, rows, angle - NORTH_SOUTH)
+    return projection.inverse(east, north)
+
+
+def estimate_waypoint_count(polygon, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """Rough number of waypoints of a plan (polygon area over the area of one grid cell), without planning it."""
+    row_step, _ = sweep_spacing(coverage_vertical, overlapping_percentage)
+    column_step, _ = sweep_spacing(coverage_horizontal, overlapping_percentage)
+    if row_step <= 0 or column_step <= 0:
+        return 0
+
+    east, north = LocalProjection.for_polygon(polygon).project_polygon(polygon)
+    area = abs(np.dot(east, np.roll(north, -1)) - np.dot(north, np.roll(east, -1))) / 2
+    return int(area / (row_step * column_step))
+
+
+def plan_waypoints(
+    polygon,
+    overlapping_percentage,
+    coverage_vertical,
+    coverage_horizontal,
+    mode=SCANLINE,
+    sweep_objective=LINES,
+    search_budget=0.05,
+):
+    """
+    Plan the survey waypoints over a decimal polygon and return them as (latitudes, longitudes) arrays.
+
+    ``grid`` builds the full bounding-box grid and filters it, ``scanline`` only emits the
+    sweep segments that cover the polygon and produces the same waypoints. ``local`` plans
+    in meters around the polygon, which keeps the spacing and margin exact at any latitude,
+    ``optimized`` additionally picks the sweep angle with the fewest lines or shortest path,
+    and ``cells`` plans like ``optimized`` but splits concave polygons into boustrophedon cells
+    so the drone does not cross the gaps on every sweep line.
+    """
+    with planning_stage("plan", mode=mode) as summary:
+        latitudes, longitudes = _plan_waypoints(
+            polygon,
+            overlapping_percentage,
+            coverage_vertical,
+            coverage_horizontal,
+            mode,
+            sweep_objective,
+            search_budget,
+        )
+        summary["points"] = len(latitudes)
+        summary["bbox"] = extent(latitudes, longitudes)
+    return latitudes, longitudes
+
+
+def _plan_waypoints(
+    polygon,
+    overlapping_percentage,
+    coverage_vertical,
+    coverage_horizontal,
+    mode,
+    sweep_objective,
+    search_budget,
+):
+    if mode == GRID:
+        latitudes, longitudes = generate_grid(polygon, overlapping_percentage, coverage_vertical, coverage_horizontal)
+        mask = filter_mask(latitudes, longitudes, polygon)
+        return latitudes[mask], longitudes[mask]
+    if mode == SCANLINE:
+        return generate_scanline_grid(polygon, overlapping_percentage, coverage_vertical, coverage_horizontal)
+    if mode in (LOCAL, OPTIMIZED, CELLS):
+        return generate_local_grid(
+            polygon,
+            overlapping_percentage,
+            coverage_vertical,
+            coverage_horizontal,
+            optimize_angle=mode in (OPTIMIZED, CELLS),
+            sweep_objective=sweep_objective,
+            search_budget=search_budget,
+            decompose=mode == CELLS,
+        )
+    raise ValueError(f"Unknown planning mode: {mode}")
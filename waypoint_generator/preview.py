@@ -0,0 +1,148 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+
+PNG = "png"
+SVG = "svg"
+
+CONTENT_TYPES = {PNG: "image/png", SVG: "image/svg+xml"}
+
+
+class _ImageRenderer(BaseRenderer):
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Images pass through, error bodies are still sent as JSON
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode()
+
+
+class PNGRenderer(_ImageRenderer):
+    media_type = CONTENT_TYPES[PNG]
+    format = PNG
+
+
+class SVGRenderer(_ImageRenderer):
+    media_type = CONTENT_TYPES[SVG]
+    format = SVG
+
+
+def decimate(latitudes, longitudes, max_points):
+    """``max_points`` evenly spaced waypoints of the route, first and last included."""
+    latitudes = np.asarray(latitudes)
+    longitudes = np.asarray(longitudes)
+    if max_points <= 1 or latitudes.size <= max_points:
+        return latitudes, longitudes
+    keep = np.linspace(0, latitudes.size - 1, max_points).round().astype(np.intp)
+    return latitudes[keep], longitudes[keep]
+
+
+def render_preview(polygon, latitudes, longitudes, image_format=PNG, max_points=5000):
+    """
+    Plot of the route over the user polygon and its bounding box, as PNG or SVG bytes.
+
+    Uses matplotlib's object API with the Agg canvas, no pyplot state, so it is safe to call
+    from worker threads of a headless server.
+    """
+    # Imported here so that planning never loads matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    latitudes, longitudes = decimate(latitudes, longitudes, max_points)
+    polygon_latitudes = [point["latitude"] for point in polygon]
+    polygon_longitudes = [point["longitude"] for point in polygon]
+    if polygon and polygon[0] != polygon[-1]:
+        polygon_latitudes.append(polygon_latitudes[0])
+        polygon_longitudes.append(polygon_longitudes[0])
+    min_lat, max_lat = min(polygon_latitudes), max(polygon_latitudes)
+    min_lon, max_lon = min(polygon_longitudes), max(polygon_longitudes)
+
+    figure = Figure(figsize=(8, 8))
+    FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    marker_size = 3 if latitudes.size <= 1000 else 0
+    ax.plot(longitudes, latitudes, "b-", marker="s", markersize=marker_size, linewidth=0.6, label="Drone waypoints")
+    ax.plot(
+        [max_lon, max_lon, min_lon, min_lon, max_lon],
+        [min_lat, max_lat, max_lat, min_lat, min_lat],
+        "r-",
+        marker="x",
+        label="Bounding box",
+    )
+    ax.plot(polygon_longitudes, polygon_latitudes, "g-", marker="o", label="User polygon")
+
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.set_title("Drone waypoints to cover whole polygon")
+    ax.legend()
+    ax.grid(True)
+
+    output = io.BytesIO()
+    figure.savefig(output, format=image_format)
+    return output.getvalue()
+
+
+class PreviewCache:
+    """
+    Renders previews on a small thread pool and keeps the images in an LRU bounded by total
+    size. Concurrent requests for the same image share one render.
+    """
+
+    def __init__(self, max_workers=2, max_bytes=64 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="preview")
+        return self._executor
+
+    def get_or_render(self, key, render, timeout=None):
+        """Image of ``key``, rendering it with ``render()`` on the pool when it is not cached."""
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+
+            future = self._in_flight.get(key)
+            if future is None:
+                future = Future()
+                self._in_flight[key] = future
+                self._get_executor().submit(self._render, key, render, future)
+        return future.result(timeout=timeout)
+
+    def _render(self, key, render, future):
+        try:
+            image = render()
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if len(image) <= self.max_bytes:
+                self._entries[key] = image
+                self._bytes += len(image)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        future.set_result(image)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,121 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+logger_info = logging.getLogger("info")
+logger_error = logging.getLogger("error")
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+TRACEMALLOC_FRAMES = 10
+
+# cProfile and tracemalloc are process wide, one profiled request at a time
+_profile_lock = threading.Lock()
+
+
+def should_profile(request):
+    """Admins opt in per request with "X-Profile: true", or a sample of their requests is profiled."""
+    if not settings.WAYPOINT_PROFILE_ENABLED:
+        return False
+    if not (request.user and request.user.is_staff):
+        return False
+    if request.META.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return random.random() < settings.WAYPOINT_PROFILE_SAMPLE_RATE
+
+
+def prune_profiles(directory, keep):
+    """Remove the oldest profiles so that at most ``keep`` are left."""
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_dir()), key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[: max(len(profiles) - keep, 0)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def write_profile(directory, profiler, snapshot, details):
+    """
+    Save one request as ``<directory>/<id>/``: ``profile.pstats`` (open with pstats or snakeviz),
+    ``memory.snapshot`` (``tracemalloc.Snapshot.load``) and ``request.json`` with the polygon and
+    parameters, which ``benchmarks/pipeline.py --replay`` runs again.
+    """
+    profile_id = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(directory, profile_id)
+    os.makedirs(path)
+    profiler.dump_stats(os.path.join(path, "profile.pstats"))
+    if snapshot is not None:
+        snapshot.dump(os.path.join(path, "memory.snapshot"))
+    with open(os.path.join(path, "request.json"), "w") as request_file:
+        json.dump(details, request_file, indent=2, default=str)
+    return profile_id
+
+
+def profiled(view_method):
+    """
+    Run the view method under cProfile and tracemalloc when ``should_profile`` says so, and save
+    the result to WAYPOINT_PROFILE_DIR (WAYPOINT_PROFILE_MAX_ENTRIES profiles are kept). The
+    response then carries the profile id in an ``X-Profile-Id`` header.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not should_profile(request) or not _profile_lock.acquire(blocking=False):
+            return view_method(self, request, *args, **kwargs)
+
+        try:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                response = profiler.runcall(view_method, self, request, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+
+            details = {
+                "path": request.path,
+                "user": request.user.username,
+                "status": response.status_code,
+                "seconds": round(seconds, 4),
+                "peak_memory_bytes": peak,
+                "request": request.data,
+                "settings": {
+                    name: getattr(settings, name)
+                    for name in (
+                        "WAYPOINT_PLANNING_MODE",
+                        "WAYPOINT_SWEEP_OBJECTIVE",
+                        "WAYPOINT_SWEEP_SEARCH_SECONDS",
+                    )
+                },
+            }
+            try:
+                directory = settings.WAYPOINT_PROFILE_DIR
+                os.makedirs(directory, exist_ok=True)
+                profile_id = write_profile(directory, profiler, snapshot, details)
+                prune_profiles(directory, settings.WAYPOINT_PROFILE_MAX_ENTRIES)
+            except OSError as e:
+                logger_error.error(f"Profile of {request.path} could not be saved: {str(e)}")
+                return response
+
+            logger_info.info(f"Profiled {request.path} in {seconds:.3f}s, profile id: {profile_id}")
+            response["X-Profile-Id"] = profile_id
+            return response
+        finally:
+            _profile_lock.release()
+
+    return wrapper
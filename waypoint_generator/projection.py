@@ -0,0 +1,57 @@
+import numpy as np
+
+from waypoint_generator.grid import EARTH_RADIUS, bounding_box_limits
+
+
+class LocalProjection:
+    """
+    Local metric frame (east, north in meters) centred on the survey area.
+
+    Uses the spherical azimuthal equidistant projection with the same earth radius as
+    ``destination_point``: distances from the origin are exact and the distortion over
+    a field of a few kilometres is negligible. Both directions work on whole arrays.
+    """
+
+    def __init__(self, origin_lat, origin_lon):
+        self.origin_lat = origin_lat
+        self.origin_lon = origin_lon
+        self._sin_lat0 = np.sin(np.radians(origin_lat))
+        self._cos_lat0 = np.cos(np.radians(origin_lat))
+
+    @classmethod
+    def for_polygon(cls, polygon):
+        min_lat, max_lat, min_lon, max_lon = bounding_box_limits(polygon)
+        return cls((min_lat + max_lat) / 2, (min_lon + max_lon) / 2)
+
+    def forward(self, latitudes, longitudes):
+        """(latitudes, longitudes) in degrees to (east, north) in meters."""
+        lat = np.radians(np.asarray(latitudes, dtype=float))
+        delta_lon = np.radians(np.asarray(longitudes, dtype=float) - self.origin_lon)
+
+        cos_c = self._sin_lat0 * np.sin(lat) + self._cos_lat0 * np.cos(lat) * np.cos(delta_lon)
+        c = np.arccos(np.clip(cos_c, -1.0, 1.0))
+        # c / sin(c) tends to 1 at the origin
+        scale = np.where(c > 0, c / np.where(c > 0, np.sin(c), 1.0), 1.0)
+
+        east = EARTH_RADIUS * scale * np.cos(lat) * np.sin(delta_lon)
+        north = EARTH_RADIUS * scale * (self._cos_lat0 * np.sin(lat) - self._sin_lat0 * np.cos(lat) * np.cos(delta_lon))
+        return east, north
+
+    def inverse(self, east, north):
+        """(east, north) in meters back to (latitudes, longitudes) in degrees."""
+        east = np.asarray(east, dtype=float)
+        north = np.asarray(north, dtype=float)
+
+        rho = np.hypot(east, north)
+        c = rho / EARTH_RADIUS
+        sin_c, cos_c = np.sin(c), np.cos(c)
+        safe_rho = np.where(rho > 0, rho, 1.0)
+
+        lat = np.arcsin(np.clip(cos_c * self._sin_lat0 + north * sin_c * self._cos_lat0 / safe_rho, -1.0, 1.0))
+        lon = np.arctan2(east * sin_c, rho * self._cos_lat0 * cos_c - north * self._sin_lat0 * sin_c)
+        return np.degrees(lat), self.origin_lon + np.degrees(lon)
+
+    def project_polygon(self, polygon):
+        latitudes = [point["latitude"] for point in polygon]
+        longitudes = [point["longitude"] for point in polygon]
+        return self.forward(latitudes, longitudes)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from waypoint_generator.geometry import SurveyArea, build_polygon
+from waypoint_generator.grid import grid_average_step, horizontal_axis, serpentine_grid, vertical_axis
+
+
+def _ranges(starts, counts):
+    # Concatenation of arange(start, start + count) for every (start, count) pair
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + (np.arange(offsets.size) - offsets)
+
+
+def _edges(geometry):
+    import shapely
+
+    starts, ends = [], []
+    for part in shapely.get_parts(geometry):
+        for ring in [part.exterior, *part.interiors]:
+            coords = np.asarray(ring.coords)
+            starts.append(coords[:-1])
+            ends.append(coords[1:])
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2))
+    return np.concatenate(starts), np.concatenate(ends)
+
+
+def sweep_intervals(column_longitudes, geometry):
+    """
+    Intersect every sweep line (a meridian at each column longitude) with the polygon edges.
+    Returns (column_index, low_latitude, high_latitude) arrays of the covered segments,
+    sorted by column and then by latitude.
+    """
+    column_longitudes = np.asarray(column_longitudes, dtype=float)
+    starts, ends = _edges(geometry)
+
+    order = np.argsort(column_longitudes, kind="stable")
+    sorted_longitudes = column_longitudes[order]
+
+    # Half-open crossing rule so that shared vertices are counted once
+    first = np.searchsorted(sorted_longitudes, np.minimum(starts[:, 0], ends[:, 0]), "left")
+    last = np.searchsorted(sorted_longitudes, np.maximum(starts[:, 0], ends[:, 0]), "left")
+    counts = last - first
+
+    edge = np.repeat(np.arange(counts.size), counts)
+    column = _ranges(first, counts)
+    x = sorted_longitudes[column]
+    x1, y1 = starts[edge, 0], starts[edge, 1]
+    x2, y2 = ends[edge, 0], ends[edge, 1]
+    y = y1 + (x - x1) / (x2 - x1) * (y2 - y1)
+
+    column = order[column]
+    crossing_order = np.lexsort((y, column))
+    column, y = column[crossing_order], y[crossing_order]
+
+    # Every closed ring crosses a line an even number of times, so crossings pair up per column
+    return column[0::2], y[0::2], y[1::2]
+
+
+def scanline_points(latitudes, column_longitudes, geometry):
+    """
+    Lattice points strictly inside ``geometry`` laid out in the serpentine order of
+    ``serpentine_grid``: even columns run south to north, odd columns north to south.
+    ``latitudes`` must be ascending. Returns flat (latitudes, longitudes) arrays.
+    Any planar frame works the same way, e.g. northings and eastings in meters.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    column_longitudes = np.asarray(column_longitudes, dtype=float)
+    if latitudes.size == 0 or column_longitudes.size == 0:
+        return np.empty(0), np.empty(0)
+
+    column, low, high = sweep_intervals(column_longitudes, geometry)
+    first = np.searchsorted(latitudes, low, "right")
+    counts = np.maximum(np.searchsorted(latitudes, high, "left") - first, 0)
+
+    row = _ranges(first, counts)
+    point_column = np.repeat(column, counts)
+
+    # Reverse the points of every odd column in place to get the serpentine order
+    column_counts = np.bincount(point_column, minlength=column_longitudes.size)
+    column_start = np.cumsum(column_counts) - column_counts
+    position = np.arange(row.size)
+    target = np.where(
+        point_column % 2 == 1,
+        2 * column_start[point_column] + column_counts[point_column] - 1 - position,
+        position,
+    )
+
+    point_latitudes = np.empty(row.size)
+    point_longitudes = np.empty(row.size)
+    point_latitudes[target] = latitudes[row]
+    point_longitudes[target] = column_longitudes[point_column]
+    return point_latitudes, point_longitudes
+
+
+def cover_lattice(latitudes, column_longitudes, area, margin):
+    """Lattice points inside ``area`` grown by ``margin``, in serpentine order."""
+    if not area.is_valid:
+        # Self-intersecting input has no well defined edge crossings, test the full grid instead
+        latitudes, longitudes = serpentine_grid(latitudes, column_longitudes)
+        mask = SurveyArea(area, margin).contains_mask(latitudes, longitudes)
+        return latitudes[mask], longitudes[mask]
+
+    if margin:
+        area = area.buffer(margin)
+    return scanline_points(latitudes, column_longitudes, area)
+
+
+def generate_scanline_grid(polygon, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """
+    Same waypoints as ``generate_grid`` followed by ``filter_points``, but only the
+    sweep segments covered by the polygon (plus the "just outside" margin) are emitted.
+    """
+    latitudes, _ = vertical_axis(polygon, overlapping_percentage, coverage_vertical)
+    _, longitudes = horizontal_axis(polygon, overlapping_percentage, coverage_horizontal)
+    margin = grid_average_step(latitudes, longitudes)
+    return cover_lattice(latitudes, longitudes, build_polygon(polygon), margin)
@@ -5,7 +5,32 @@ from .models import FlightPath
 class FlightPathSerializer(serializers.ModelSerializer):
     class Meta:
         model = FlightPath
-        fields = "__all__"
+        exclude = ("waypoints_data",)
+        read_only_fields = ("plan_key", "status", "error_message")
+
+    # Fields the plan key is computed from, besides the waypoints themselves
+    PLAN_FIELDS = ("polygon_lat_lon", "altitude", "overlapping_percentage", "planning_mode")
+
+    def update(self, instance, validated_data):
+        # Waypoints sent by the client replace the packed ones
+        if "waypoints" in validated_data:
+            instance.waypoints_data = None
+        # Edited waypoints, or waypoints planned for other inputs, must not be reused as a cached plan
+        if "waypoints" in validated_data or any(
+            field in validated_data and validated_data[field] != getattr(instance, field) for field in self.PLAN_FIELDS
+        ):
+            instance.plan_key = None
+        return super().update(instance, validated_data)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get("exclude_waypoints"):
+            data.pop("waypoints", None)
+            return data
+        # Waypoints stored in the binary column are returned in the same list format
+        if instance.waypoints_data is not None:
+            data["waypoints"] = instance.waypoint_list
+        return data
 
     def validate(self, data):
         if len(data["polygon_lat_lon"]) < 3:
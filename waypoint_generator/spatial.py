@@ -0,0 +1,90 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+POINTS_PER_CELL = 64  # Average waypoints per bucket of the index grid
+
+
+class WaypointIndex:
+    """
+    Bucket grid over the waypoints of one plan for bounding-box queries.
+
+    Waypoints are sorted by grid cell (row-major) and ``offsets`` marks where every cell starts,
+    so the cells of one grid row in a query are a single contiguous slice of ``order``.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        count = self.latitudes.size
+        if count == 0:
+            self.order = np.empty(0, dtype=np.intp)
+            return
+
+        self.min_lat, self.max_lat = self.latitudes.min(), self.latitudes.max()
+        self.min_lon, self.max_lon = self.longitudes.min(), self.longitudes.max()
+        side = max(1, int(math.sqrt(count / POINTS_PER_CELL)))
+        self.rows = side if self.max_lat > self.min_lat else 1
+        self.columns = side if self.max_lon > self.min_lon else 1
+
+        cells = self._row(self.latitudes) * self.columns + self._column(self.longitudes)
+        self.order = np.argsort(cells, kind="stable")
+        self.offsets = np.searchsorted(cells[self.order], np.arange(self.rows * self.columns + 1))
+
+    def _row(self, latitudes):
+        scale = self.rows / (self.max_lat - self.min_lat) if self.rows > 1 else 0
+        return np.clip(((latitudes - self.min_lat) * scale).astype(np.intp), 0, self.rows - 1)
+
+    def _column(self, longitudes):
+        scale = self.columns / (self.max_lon - self.min_lon) if self.columns > 1 else 0
+        return np.clip(((longitudes - self.min_lon) * scale).astype(np.intp), 0, self.columns - 1)
+
+    def query(self, min_lat, min_lon, max_lat, max_lon):
+        """Indexes, in route order, of the waypoints inside the box (edges included)."""
+        if self.order.size == 0 or min_lat > self.max_lat or max_lat < self.min_lat:
+            return np.empty(0, dtype=np.intp)
+        if min_lon > self.max_lon or max_lon < self.min_lon:
+            return np.empty(0, dtype=np.intp)
+
+        first_row, last_row = self._row(np.array([min_lat, max_lat]))
+        first_column, last_column = self._column(np.array([min_lon, max_lon]))
+        row_cells = np.arange(first_row, last_row + 1) * self.columns
+        starts = self.offsets[row_cells + first_column]
+        stops = self.offsets[row_cells + last_column + 1]
+        candidates = np.concatenate([self.order[start:stop] for start, stop in zip(starts, stops)])
+
+        latitudes = self.latitudes[candidates]
+        longitudes = self.longitudes[candidates]
+        inside = (latitudes >= min_lat) & (latitudes <= max_lat) & (longitudes >= min_lon) & (longitudes <= max_lon)
+        return np.sort(candidates[inside])
+
+
+class IndexCache:
+    """Small LRU of ``WaypointIndex`` objects, built on first access."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, load):
+        """Index of ``key``, built from the (latitudes, longitudes) returned by ``load()`` on a miss."""
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+
+        index = WaypointIndex(*load())
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = index
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+NDJSON = "ndjson"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+CHUNK_SIZE = 10000  # Waypoints encoded per chunk of the response body
+_WAYPOINTS_PLACEHOLDER = "__waypoints__"
+
+
+def _dumps(data):
+    # Same output as DRF's JSONRenderer with its default compact, unicode settings
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders a list as one JSON document per line and anything else as a single line."""
+
+    media_type = NDJSON_MEDIA_TYPE
+    format = NDJSON
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        items = data if isinstance(data, list) else [data]
+        return "".join(_dumps(item) + "\n" for item in items).encode()
+
+
+def iter_waypoint_chunks(latitudes, longitudes, chunk_size=CHUNK_SIZE):
+    """Yield (latitudes, longitudes) lists of at most ``chunk_size`` waypoints."""
+    latitudes = np.asarray(latitudes)
+    longitudes = np.asarray(longitudes)
+    for start in range(0, latitudes.size, chunk_size):
+        stop = start + chunk_size
+        yield latitudes[start:stop].tolist(), longitudes[start:stop].tolist()
+
+
+def encode_ndjson(latitudes, longitudes, chunk_size=CHUNK_SIZE):
+    for chunk_latitudes, chunk_longitudes in iter_waypoint_chunks(latitudes, longitudes, chunk_size):
+        yield "".join(
+            f'{{"latitude":{lat!r},"longitude":{lon!r}}}\n' for lat, lon in zip(chunk_latitudes, chunk_longitudes)
+        ).encode()
+
+
+def encode_json_array(latitudes, longitudes, chunk_size=CHUNK_SIZE):
+    separator = "["
+    for chunk_latitudes, chunk_longitudes in iter_waypoint_chunks(latitudes, longitudes, chunk_size):
+        body = ",".join(
+            f'{{"latitude":{lat!r},"longitude":{lon!r}}}' for lat, lon in zip(chunk_latitudes, chunk_longitudes)
+        )
+        yield (separator + body).encode()
+        separator = ","
+    yield b"[]" if separator == "[" else b"]"
+
+
+def stream_waypoints(envelope, latitudes, longitudes, ndjson=False, status=200, chunk_size=CHUNK_SIZE):
+    """
+    Streaming response for a planned flight path, encoded one chunk at a time from the arrays.
+
+    As JSON the body is exactly ``envelope`` rendered with its ``data["waypoints"]`` filled in.
+    As NDJSON the first line is ``envelope`` (without waypoints) and every following line is
+    one waypoint.
+
+    Only one chunk is encoded at a time, but the arrays themselves stay whole in memory until
+    the response is sent.
+    """
+    if ndjson:
+
+        def body():
+            yield (_dumps(envelope) + "\n").encode()
+            yield from encode_ndjson(latitudes, longitudes, chunk_size)
+
+        content_type = NDJSON_MEDIA_TYPE
+    else:
+        envelope = dict(envelope, data=dict(envelope["data"], waypoints=_WAYPOINTS_PLACEHOLDER))
+        head, tail = _dumps(envelope).split(_dumps(_WAYPOINTS_PLACEHOLDER))
+
+        def body():
+            yield head.encode()
+            yield from encode_json_array(latitudes, longitudes, chunk_size)
+            yield tail.encode()
+
+        content_type = "application/json"
+
+    response = StreamingHttpResponse(body(), status=status, content_type=content_type)
+    response["X-Waypoint-Count"] = str(np.asarray(latitudes).size)
+    return response
@@ -0,0 +1,131 @@
+import math
+import time
+
+import numpy as np
+
+from waypoint_generator.grid import grid_average_step, planar_axes
+from waypoint_generator.scanline import cover_lattice
+
+LINES = "lines"
+LENGTH = "length"
+
+SWEEP_OBJECTIVES = (LINES, LENGTH)
+
+NORTH_SOUTH = math.pi / 2  # Sweep direction of the default planner, measured from east
+COARSE_ANGLES = 36  # Fallback angles tried (every 5 degrees) while the time budget allows
+
+
+def rotate(x, y, angle):
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return x * cos_a - y * sin_a, x * sin_a + y * cos_a
+
+
+def minimum_width_angles(east, north):
+    """
+    Rotating calipers over the convex hull of the polygon.
+    Returns (angles, widths): for every hull edge its direction (radians from east) and the
+    width of the hull measured perpendicular to it, sorted by width. Sweeping parallel to the
+    first angle needs the fewest sweep lines.
+    """
+    import shapely
+    from shapely.geometry import Polygon
+    from shapely.geometry.polygon import orient
+
+    hull = shapely.multipoints(np.column_stack((east, north))).convex_hull
+    if not isinstance(hull, Polygon):
+        return np.array([NORTH_SOUTH]), np.array([0.0])
+
+    vertices = np.asarray(orient(hull, 1.0).exterior.coords)[:-1]
+    edges = np.roll(vertices, -1, axis=0) - vertices
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+
+    # Edge directions of a counter-clockwise hull increase monotonically, the vertex farthest from
+    # edge i is the one where the direction turns past angles[i] + pi.
+    unwrapped = angles[0] + np.mod(angles - angles[0], 2 * math.pi)
+    antipodal = np.searchsorted(np.concatenate((unwrapped, unwrapped + 2 * math.pi)), unwrapped + math.pi)
+    antipodal %= len(vertices)
+
+    normals = np.column_stack((-edges[:, 1], edges[:, 0])) / np.hypot(edges[:, 0], edges[:, 1])[:, None]
+    widths = np.abs(np.einsum("ij,ij->i", vertices[antipodal] - vertices, normals))
+
+    order = np.argsort(widths, kind="stable")
+    return np.mod(angles[order], math.pi), widths[order]
+
+
+def rotated_lattice(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """
+    Rotate the polygon so that sweep lines along ``angle`` (radians from east) point north.
+    Returns (rows, columns, polygon, margin) of that frame.
+    """
+    from shapely.geometry import Polygon
+
+    rotated_east, rotated_north = rotate(east, north, NORTH_SOUTH - angle)
+    rows, columns = planar_axes(
+        rotated_east.min(),
+        rotated_east.max(),
+        rotated_north.min(),
+        rotated_north.max(),
+        overlapping_percentage,
+        coverage_vertical,
+        coverage_horizontal,
+    )
+    return rows, columns, Polygon(zip(rotated_east, rotated_north)), grid_average_step(rows, columns)
+
+
+def plan_rotated(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal):
+    """Plan with sweep lines along ``angle``, returns the waypoints as (north, east) in the rotated frame."""
+    return cover_lattice(
+        *rotated_lattice(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal)
+    )
+
+
+def _sweep_cost(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal, objective):
+    if objective == LINES:
+        # Only the extent across the sweep direction matters, no need to plan the points
+        rotated_east, _ = rotate(east, north, NORTH_SOUTH - angle)
+        _, columns = planar_axes(
+            rotated_east.min(), rotated_east.max(), 0, 0, overlapping_percentage, coverage_vertical, coverage_horizontal
+        )
+        return len(columns)
+
+    rows, columns = plan_rotated(east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal)
+    return float(np.hypot(np.diff(rows), np.diff(columns)).sum())
+
+
+def optimize_sweep_angle(
+    east, north, overlapping_percentage, coverage_vertical, coverage_horizontal, objective=LINES, time_budget=0.05
+):
+    """
+    Sweep angle (radians from east) minimizing the number of sweep lines or the total path length.
+
+    Candidates are tried best first: the minimum-width direction, the default north-south
+    sweep, the remaining hull edges by width and then a coarse 5 degree scan. The search
+    stops once ``time_budget`` seconds are spent, so it is always cheap to call.
+    """
+    if objective not in SWEEP_OBJECTIVES:
+        raise ValueError(f"Unknown sweep objective: {objective}")
+
+    deadline = time.perf_counter() + time_budget
+    edge_angles, _ = minimum_width_angles(east, north)
+    coarse_angles = np.linspace(0, math.pi, COARSE_ANGLES, endpoint=False)
+    candidates = [edge_angles[0], NORTH_SOUTH, *edge_angles[1:], *coarse_angles]
+
+    best_angle, best_cost = None, None
+    tried = set()
+    for angle in candidates:
+        key = round(float(angle), 9)
+        if key in tried:
+            continue
+        tried.add(key)
+
+        cost = _sweep_cost(
+            east, north, angle, overlapping_percentage, coverage_vertical, coverage_horizontal, objective
+        )
+        if best_cost is None or cost < best_cost:
+            best_angle, best_cost = float(angle), cost
+        # Always compare against the default direction before giving up
+        if len(tried) >= 2 and time.perf_counter() > deadline:
+            break
+    return best_angle
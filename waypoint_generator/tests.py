@@ -1,3 +1,595 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts_engine.models import CustomUser
+from drone_flight_planner import log_handlers
+from drone_flight_planner.log_handlers import ConsoleHandler, InterProcessRotatingFileHandler, QueuedHandler
+
+from waypoint_generator.cache import PlanCache
+from waypoint_generator.codec import DELTA, DELTA_DECIMALS, FLOAT64, decode_waypoints, encode_waypoints, waypoint_count
+from waypoint_generator.grid import from_waypoints, generate_grid, horizontal_axis, to_waypoints, vertical_axis
+from waypoint_generator.models import FlightPath
+from waypoint_generator import pipeline
+from waypoint_generator.pipeline import JobHeartbeat, claim_next_job, get_plan_key, plan_batch, requeue_stale_jobs
+from waypoint_generator.planner import CELLS, OPTIMIZED, plan_waypoints
+from waypoint_generator.scanline import generate_scanline_grid
+from waypoint_generator.services import GoProHero9Black
+from waypoint_generator.spatial import IndexCache, WaypointIndex
+from waypoint_generator.streaming import stream_waypoints
+from waypoint_generator.utils import get_bounding_box, horizontal_move_point, vertical_move_point
+from waypoint_generator.views import FlightPathViewSet
+
+SQUARE = [
+    {"latitude": 23.80, "longitude": 86.68},
+    {"latitude": 23.81, "longitude": 86.68},
+    {"latitude": 23.81, "longitude": 86.69},
+    {"latitude": 23.80, "longitude": 86.69},
+    {"latitude": 23.80, "longitude": 86.68},
+]
+TRIANGLE = [
+    {"latitude": 23.80, "longitude": 86.68},
+    {"latitude": 23.81, "longitude": 86.69},
+    {"latitude": 23.805, "longitude": 86.70},
+    {"latitude": 23.80, "longitude": 86.68},
+]
+# Concave "U": the sweep lines cross it in two segments
+U_SHAPE = [
+    {"latitude": -33.870, "longitude": 151.200},
+    {"latitude": -33.870, "longitude": 151.212},
+    {"latitude": -33.858, "longitude": 151.212},
+    {"latitude": -33.858, "longitude": 151.208},
+    {"latitude": -33.866, "longitude": 151.208},
+    {"latitude": -33.866, "longitude": 151.204},
+    {"latitude": -33.858, "longitude": 151.204},
+    {"latitude": -33.858, "longitude": 151.200},
+]
+
+
+# The per-point loops the grid engine replaced, kept here as the reference
+def loop_vertical_waypoints(polygon, overlapping_percentage, coverage_vertical):
+    move_distance = coverage_vertical - coverage_vertical * (overlapping_percentage / 100)
+    start_move = -(move_distance - abs((coverage_vertical / 2) - coverage_vertical * (overlapping_percentage / 100)))
+    min_lat = min(point["latitude"] for point in polygon)
+    max_lat = max(point["latitude"] for point in polygon)
+    max_lon = max(point["longitude"] for point in polygon)
+
+    lat, lon = vertical_move_point(min_lat, max_lon, start_move, 0)
+    lat, lon = vertical_move_point(lat, lon, start_move, 270)
+    max_lat, _ = vertical_move_point(max_lat, max_lon, move_distance, 0)
+    waypoints = []
+    while lat <= max_lat:
+        waypoints.append({"latitude": lat, "longitude": lon})
+        lat, lon = vertical_move_point(lat, lon, move_distance, 0)
+    return waypoints
+
+
+def loop_horizontal_waypoints(polygon, overlapping_percentage, coverage_horizontal):
+    move_distance = coverage_horizontal - coverage_horizontal * (overlapping_percentage / 100)
+    start_move = -(
+        move_distance - abs((coverage_horizontal / 2) - coverage_horizontal * (overlapping_percentage / 100))
+    )
+    min_lat = min(point["latitude"] for point in polygon)
+    min_lon = min(point["longitude"] for point in polygon)
+    max_lon = max(point["longitude"] for point in polygon)
+
+    lat, lon = horizontal_move_point(min_lat, max_lon, start_move, 0)
+    lat, lon = horizontal_move_point(lat, lon, start_move, 270)
+    _, min_lon = vertical_move_point(min_lat, min_lon, move_distance, 270)
+    waypoints = []
+    while lon > min_lon:
+        waypoints.append({"latitude": lat, "longitude": lon})
+        lat, lon = horizontal_move_point(lat, lon, move_distance, 270)
+    return waypoints
+
+
+def loop_all_points(vertical_points, horizontal_points):
+    latitudes = [point["latitude"] for point in vertical_points]
+    all_points = []
+    for index, point in enumerate(horizontal_points):
+        for lat in latitudes if index % 2 == 0 else latitudes[::-1]:
+            all_points.append({"latitude": lat, "longitude": point["longitude"]})
+    return all_points
+
+
+def loop_filter_points(points, polygon_coords):
+    from shapely.geometry import Point, Polygon
+
+    distances = [
+        ((b["latitude"] - a["latitude"]) ** 2 + (b["longitude"] - a["longitude"]) ** 2) ** 0.5
+        for a, b in zip(points, points[1:])
+    ]
+    buffer_distance = sum(distances) / len(distances) if distances else 0
+    polygon = Polygon([(p["longitude"], p["latitude"]) for p in polygon_coords])
+    buffered = polygon.buffer(buffer_distance)
+    return [p for p in points if buffered.contains(Point(p["longitude"], p["latitude"]))]
+
+
+class GridEngineTests(SimpleTestCase):
+    camera = GoProHero9Black()
+
+    def fov(self, altitude):
+        return self.camera.get_fov(altitude)
+
+    def assert_same_points(self, latitudes, longitudes, points):
+        expected_latitudes, expected_longitudes = from_waypoints(points)
+        self.assertEqual(len(latitudes), len(points))
+        np.testing.assert_allclose(latitudes, expected_latitudes, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(longitudes, expected_longitudes, rtol=0, atol=1e-9)
+
+    def test_axes_match_the_loops(self):
+        for polygon in (SQUARE, TRIANGLE, U_SHAPE):
+            for altitude, overlap in ((50, 60), (120, 75), (100, 90)):
+                coverage_vertical, coverage_horizontal = self.fov(altitude)
+                with self.subTest(polygon=polygon[0], altitude=altitude, overlap=overlap):
+                    self.assert_same_points(
+                        *vertical_axis(polygon, overlap, coverage_vertical),
+                        loop_vertical_waypoints(polygon, overlap, coverage_vertical),
+                    )
+                    self.assert_same_points(
+                        *horizontal_axis(polygon, overlap, coverage_horizontal),
+                        loop_horizontal_waypoints(polygon, overlap, coverage_horizontal),
+                    )
+
+    def test_grid_matches_the_loops(self):
+        coverage_vertical, coverage_horizontal = self.fov(100)
+        expected = loop_all_points(
+            loop_vertical_waypoints(SQUARE, 80, coverage_vertical),
+            loop_horizontal_waypoints(SQUARE, 80, coverage_horizontal),
+        )
+        self.assert_same_points(*generate_grid(SQUARE, 80, coverage_vertical, coverage_horizontal), expected)
+
+    def test_scanline_matches_grid_and_filter(self):
+        for polygon in (SQUARE, TRIANGLE, U_SHAPE):
+            for altitude, overlap in ((50, 60), (120, 75)):
+                coverage_vertical, coverage_horizontal = self.fov(altitude)
+                grid = loop_all_points(
+                    loop_vertical_waypoints(polygon, overlap, coverage_vertical),
+                    loop_horizontal_waypoints(polygon, overlap, coverage_horizontal),
+                )
+                with self.subTest(polygon=polygon[0], altitude=altitude, overlap=overlap):
+                    self.assert_same_points(
+                        *generate_scanline_grid(polygon, overlap, coverage_vertical, coverage_horizontal),
+                        loop_filter_points(grid, polygon),
+                    )
+
+    def test_view_grid_mode_matches_the_loops(self):
+        view = FlightPathViewSet()
+        for polygon in (TRIANGLE, U_SHAPE):
+            coverage_vertical, coverage_horizontal = self.fov(120)
+            grid = loop_all_points(
+                loop_vertical_waypoints(polygon, 75, coverage_vertical),
+                loop_horizontal_waypoints(polygon, 75, coverage_horizontal),
+            )
+            with self.subTest(polygon=polygon[0]):
+                self.assert_same_points(
+                    *view.compute_waypoints(polygon, get_bounding_box(polygon), 120, 75, "grid"),
+                    loop_filter_points(grid, polygon),
+                )
+
+    def test_view_accepts_the_removed_hooks(self):
+        view = FlightPathViewSet(plot_waypoints=print, filter_points=print, generate_all_points=print)
+        self.assertFalse(hasattr(view, "plot_waypoints"))
+
+    def test_empty_axis_without_spacing(self):
+        coverage_vertical, _ = self.fov(100)
+        latitudes, longitudes = vertical_axis(SQUARE, 100, coverage_vertical)
+        self.assertEqual(latitudes.size, 0)
+        self.assertEqual(longitudes.size, 0)
+
+
+class CellDecompositionTests(SimpleTestCase):
+    camera = GoProHero9Black()
+
+    def plan(self, polygon, altitude, overlap, mode):
+        coverage_vertical, coverage_horizontal = self.camera.get_fov(altitude)
+        # A budget large enough to try every candidate angle, so both modes pick the same one
+        return plan_waypoints(polygon, overlap, coverage_vertical, coverage_horizontal, mode=mode, search_budget=60)
+
+    def test_cells_cover_the_same_points_as_optimized(self):
+        for polygon in (SQUARE, TRIANGLE, U_SHAPE):
+            for altitude, overlap in ((50, 60), (120, 75)):
+                with self.subTest(polygon=polygon[0], altitude=altitude, overlap=overlap):
+                    latitudes, longitudes = self.plan(polygon, altitude, overlap, CELLS)
+                    expected_latitudes, expected_longitudes = self.plan(polygon, altitude, overlap, OPTIMIZED)
+                    self.assertEqual(latitudes.size, expected_latitudes.size)
+                    order = np.lexsort((longitudes, latitudes))
+                    expected_order = np.lexsort((expected_longitudes, expected_latitudes))
+                    np.testing.assert_allclose(latitudes[order], expected_latitudes[expected_order], rtol=0, atol=1e-9)
+                    np.testing.assert_allclose(
+                        longitudes[order], expected_longitudes[expected_order], rtol=0, atol=1e-9
+                    )
+
+
+class CodecTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.latitudes = 23.8 + np.cumsum(rng.uniform(0, 1e-4, 1000))
+        self.longitudes = 86.68 + np.cumsum(rng.uniform(-1e-4, 1e-4, 1000))
+
+    def test_float64_round_trip_is_lossless(self):
+        data = encode_waypoints(self.latitudes, self.longitudes, FLOAT64)
+        latitudes, longitudes = decode_waypoints(memoryview(data))
+        np.testing.assert_array_equal(latitudes, self.latitudes)
+        np.testing.assert_array_equal(longitudes, self.longitudes)
+        self.assertFalse(latitudes.flags.writeable)
+        self.assertEqual(waypoint_count(data), 1000)
+
+    def test_delta_round_trip_within_resolution(self):
+        data = encode_waypoints(self.latitudes, self.longitudes, DELTA)
+        latitudes, longitudes = decode_waypoints(data)
+        tolerance = 0.5 * 10.0**-DELTA_DECIMALS + 1e-12
+        np.testing.assert_allclose(latitudes, self.latitudes, rtol=0, atol=tolerance)
+        np.testing.assert_allclose(longitudes, self.longitudes, rtol=0, atol=tolerance)
+        self.assertEqual(waypoint_count(data), 1000)
+        self.assertLess(len(data), len(encode_waypoints(self.latitudes, self.longitudes, FLOAT64)))
+
+    def test_empty_plan(self):
+        for storage_format in (FLOAT64, DELTA):
+            with self.subTest(storage_format=storage_format):
+                latitudes, longitudes = decode_waypoints(encode_waypoints([], [], storage_format))
+                self.assertEqual(latitudes.size, 0)
+                self.assertEqual(longitudes.size, 0)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            encode_waypoints(self.latitudes, self.longitudes, "float32")
+        with self.assertRaises(ValueError):
+            decode_waypoints(b"XX" + bytes(14))
+
+
+class PlanCacheTests(SimpleTestCase):
+    def plan(self, size):
+        return np.arange(size, dtype=float), np.arange(size, dtype=float)
+
+    def test_lru_eviction_by_entries(self):
+        cache = PlanCache(max_entries=2)
+        cache.put("a", *self.plan(1))
+        cache.put("b", *self.plan(1))
+        cache.get("a")
+        cache.put("c", *self.plan(1))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_eviction_by_points(self):
+        cache = PlanCache(max_entries=10, max_points=5)
+        cache.put("a", *self.plan(3))
+        cache.put("b", *self.plan(3))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["points"], 3)
+
+        # A plan larger than the whole cache is returned but not kept
+        latitudes, _ = cache.put("c", *self.plan(6))
+        self.assertEqual(latitudes.size, 6)
+        self.assertIsNone(cache.get("c"))
+        self.assertIsNotNone(cache.get("b"))
+
+    def test_entries_are_read_only(self):
+        latitudes, longitudes = PlanCache().put("a", *self.plan(3))
+        self.assertFalse(latitudes.flags.writeable)
+        self.assertFalse(longitudes.flags.writeable)
+
+    def test_load_before_compute(self):
+        cache = PlanCache()
+        calls = []
+        entry = cache.get_or_compute("a", lambda: calls.append("compute") or self.plan(2), load=lambda: self.plan(2))
+        self.assertEqual(calls, [])
+        self.assertEqual(entry[0].size, 2)
+        cache.get_or_compute("a", lambda: calls.append("compute") or self.plan(2))
+        self.assertEqual(calls, [])
+        stats = cache.stats()
+        self.assertEqual((stats["database_hits"], stats["hits"], stats["misses"]), (1, 1, 0))
+
+    def test_concurrent_requests_are_coalesced(self):
+        cache = PlanCache()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(threading.current_thread().name)
+            started.set()
+            release.wait(5)
+            return self.plan(4)
+
+        results = {}
+
+        def request(name):
+            results[name] = cache.get_or_compute("a", compute)
+
+        leader = threading.Thread(target=request, args=("leader",))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=request, args=("follower",))
+        follower.start()
+        deadline = time.monotonic() + 5
+        while cache.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertIs(results["leader"], results["follower"])
+        self.assertEqual(cache.stats()["coalesced"], 1)
+
+    def test_failure_reaches_waiters_and_is_not_cached(self):
+        cache = PlanCache()
+
+        def compute():
+            raise ValueError("no plan")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_compute("a", compute)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_or_compute("a", lambda: self.plan(1))[0].size, 1)
+
+
+class PlanningJobTests(TransactionTestCase):
+    # The heartbeat writes from its own thread and connection, it must see committed rows
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(contact="+919999999992", username="surveyor")
+
+    def queue(self):
+        return FlightPath.objects.create(
+            user=self.user, polygon_lat_lon=SQUARE, altitude=100, overlapping_percentage=80, status=FlightPath.QUEUED
+        )
+
+    def test_only_jobs_without_a_recent_heartbeat_are_requeued(self):
+        long_running, dead = self.queue(), self.queue()
+        self.assertEqual(claim_next_job().id, long_running.id)
+        self.assertEqual(claim_next_job().id, dead.id)
+
+        # Both were claimed long ago, only the first one's worker is still beating
+        claimed_at = timezone.now() - timedelta(hours=1)
+        FlightPath.objects.filter(id__in=[long_running.id, dead.id]).update(
+            updated_datetime=claimed_at, heartbeat_datetime=claimed_at
+        )
+        FlightPath.objects.filter(id=long_running.id).update(heartbeat_datetime=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(timeout=60), 1)
+        statuses = dict(FlightPath.objects.values_list("id", "status"))
+        self.assertEqual(statuses, {long_running.id: FlightPath.RUNNING, dead.id: FlightPath.QUEUED})
+
+    def test_heartbeat_renews_a_running_job(self):
+        flight_path = self.queue()
+        claim_next_job()
+        stale = timezone.now() - timedelta(hours=1)
+        FlightPath.objects.filter(id=flight_path.id).update(heartbeat_datetime=stale)
+
+        with JobHeartbeat(flight_path.id, interval=0.01):
+            deadline = time.monotonic() + 5
+            while FlightPath.objects.get(id=flight_path.id).heartbeat_datetime == stale:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        self.assertEqual(requeue_stale_jobs(timeout=60), 0)
+
+
+class BatchPlanningTests(TestCase):
+    camera = GoProHero9Black()
+
+    def setUp(self):
+        patcher = mock.patch.object(pipeline, "plan_cache", PlanCache())
+        self.plan_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def plan_batch(self, jobs):
+        with mock.patch.object(pipeline, "plan_waypoints", wraps=pipeline.plan_waypoints) as planner:
+            results = plan_batch(jobs, self.camera, workers=1)
+        return results, planner.call_count
+
+    def test_identical_jobs_are_planned_once_and_returned_in_order(self):
+        square, triangle = (SQUARE, 100, 80, "scanline"), (TRIANGLE, 100, 80, "scanline")
+        results, planned = self.plan_batch([square, triangle, square])
+        self.assertEqual(planned, 2)
+        self.assertEqual(
+            [key for key, _ in results],
+            [get_plan_key(*job[:3], self.camera, job[3]) for job in (square, triangle, square)],
+        )
+        self.assertIs(results[0][1], results[2][1])
+        coverage_vertical, coverage_horizontal = self.camera.get_fov(100)
+        expected = plan_waypoints(TRIANGLE, 80, coverage_vertical, coverage_horizontal, mode="scanline")
+        np.testing.assert_array_equal(results[1][1][0], expected[0])
+
+    def test_cached_plans_are_reused(self):
+        job = (SQUARE, 100, 80, "scanline")
+        key = get_plan_key(*job[:3], self.camera, job[3])
+        cached = self.plan_cache.put(key, np.zeros(2), np.zeros(2))
+        results, planned = self.plan_batch([job])
+        self.assertEqual(planned, 0)
+        self.assertIs(results[0][1], cached)
+
+    def test_failed_job_does_not_fail_the_batch(self):
+        results, _ = self.plan_batch([(SQUARE, 100, 80, "scanline"), (SQUARE, 100, 80, "unknown")])
+        self.assertGreater(results[0][1][0].size, 0)
+        self.assertIsInstance(results[1][1], Exception)
+        self.assertIsNone(self.plan_cache.get(results[1][0]))
+
+    @override_settings(WAYPOINT_ASYNC_MIN_POINTS=1000)
+    def test_batch_endpoint_queues_large_surveys(self):
+        admin = CustomUser.objects.create_superuser(contact="+919999999993", password="x", username="admin")
+        client = APIClient()
+        client.force_authenticate(admin)
+        small = {"polygon_lat_lon": TRIANGLE, "altitude": 120, "overlapping_percentage": 60}
+        large = {"polygon_lat_lon": U_SHAPE, "altitude": 100, "overlapping_percentage": 90}
+
+        response = client.post("/generate_waypoints/batch/", {"flight_paths": [large, small]}, format="json")
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["data"]["results"]
+        self.assertEqual([result["status"] for result in results], [FlightPath.QUEUED, FlightPath.DONE])
+        self.assertIsNone(results[0]["waypoint_count"])
+        self.assertLess(results[1]["waypoint_count"], 1000)
+        queued = FlightPath.objects.get(id=results[0]["id"])
+        self.assertIsNone(queued.waypoint_arrays)
+        self.assertIsNotNone(queued.plan_key)
+
+
+class StreamingTests(TestCase):
+    envelope = {"success": True, "message": "Waypoints générés", "data": {"id": 7}}
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def rendered(self, latitudes, longitudes):
+        data = dict(self.envelope["data"], waypoints=to_waypoints(latitudes, longitudes))
+        return JSONRenderer().render(dict(self.envelope, data=data))
+
+    def test_json_stream_is_byte_identical_to_the_rendered_response(self):
+        latitudes = 23.8 + np.arange(7) / 3
+        longitudes = 86.68 - np.arange(7) / 7
+        for size in (0, 1, 3, 7):
+            for chunk_size in (1, 3, 10):
+                with self.subTest(size=size, chunk_size=chunk_size):
+                    response = stream_waypoints(
+                        self.envelope, latitudes[:size], longitudes[:size], chunk_size=chunk_size
+                    )
+                    self.assertEqual(self.body(response), self.rendered(latitudes[:size], longitudes[:size]))
+                    self.assertEqual(response["X-Waypoint-Count"], str(size))
+
+    def test_json_stream_is_encoded_chunk_by_chunk(self):
+        latitudes = np.arange(10, dtype=float)
+        chunks = list(stream_waypoints(self.envelope, latitudes, latitudes, chunk_size=4).streaming_content)
+        # Envelope head, three waypoint chunks, closing bracket and envelope tail
+        self.assertEqual(len(chunks), 6)
+
+    def test_ndjson_stream(self):
+        latitudes, longitudes = 23.8 + np.arange(5) / 3, 86.68 - np.arange(5) / 7
+        response = stream_waypoints(self.envelope, latitudes, longitudes, ndjson=True, chunk_size=2)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.body(response).decode().splitlines()
+        self.assertEqual(json.loads(lines[0]), self.envelope)
+        self.assertEqual([json.loads(line) for line in lines[1:]], to_waypoints(latitudes, longitudes))
+
+    def test_create_streams_the_same_body(self):
+        admin = CustomUser.objects.create_superuser(contact="+919999999994", password="x", username="admin")
+        client = APIClient()
+        client.force_authenticate(admin)
+        payload = {"polygon_lat_lon": U_SHAPE, "altitude": 100, "overlapping_percentage": 80}
+
+        rendered = client.post("/generate_waypoints/", payload, format="json")
+        streamed = client.post("/generate_waypoints/?stream=true", payload, format="json")
+        self.assertEqual(streamed.status_code, 201)
+        self.assertTrue(streamed.streaming)
+        body = self.body(streamed)
+        # Only the id of the new flight path differs
+        ids = rendered.json()["data"]["id"], json.loads(body)["data"]["id"]
+        self.assertEqual(body, rendered.content.replace(f'"id":{ids[0]},'.encode(), f'"id":{ids[1]},'.encode()))
+
+
+class WaypointIndexTests(SimpleTestCase):
+    def brute_force(self, latitudes, longitudes, min_lat, min_lon, max_lat, max_lon):
+        inside = (latitudes >= min_lat) & (latitudes <= max_lat) & (longitudes >= min_lon) & (longitudes <= max_lon)
+        return np.flatnonzero(inside)
+
+    def test_query_matches_a_full_scan(self):
+        rng = np.random.default_rng(3)
+        latitudes = 23.8 + rng.uniform(0, 0.05, 5000)
+        longitudes = 86.68 + rng.uniform(0, 0.05, 5000)
+        index = WaypointIndex(latitudes, longitudes)
+        for _ in range(200):
+            min_lat, max_lat = np.sort(23.79 + rng.uniform(0, 0.07, 2))
+            min_lon, max_lon = np.sort(86.67 + rng.uniform(0, 0.07, 2))
+            np.testing.assert_array_equal(
+                index.query(min_lat, min_lon, max_lat, max_lon),
+                self.brute_force(latitudes, longitudes, min_lat, min_lon, max_lat, max_lon),
+            )
+
+    def test_query_includes_the_edges_and_keeps_route_order(self):
+        coverage_vertical, coverage_horizontal = GoProHero9Black().get_fov(100)
+        latitudes, longitudes = generate_scanline_grid(U_SHAPE, 80, coverage_vertical, coverage_horizontal)
+        index = WaypointIndex(latitudes, longitudes)
+        # A box whose corners are waypoints themselves
+        min_lat, max_lat = np.sort(latitudes[[10, 400]])
+        min_lon, max_lon = np.sort(longitudes[[10, 400]])
+        found = index.query(min_lat, min_lon, max_lat, max_lon)
+        np.testing.assert_array_equal(
+            found, self.brute_force(latitudes, longitudes, min_lat, min_lon, max_lat, max_lon)
+        )
+        self.assertIn(10, found)
+        self.assertIn(400, found)
+        self.assertEqual(
+            index.query(latitudes.min(), longitudes.min(), latitudes.max(), longitudes.max()).size, latitudes.size
+        )
+
+    def test_degenerate_plans(self):
+        self.assertEqual(WaypointIndex([], []).query(0, 0, 1, 1).size, 0)
+        # One sweep line: every waypoint has the same longitude
+        index = WaypointIndex(np.arange(100.0), np.full(100, 5.0))
+        np.testing.assert_array_equal(index.query(10, 5, 19.5, 5), np.arange(10, 20))
+        self.assertEqual(index.query(10, 5.1, 20, 6).size, 0)
+        self.assertEqual(index.query(200, 0, 300, 10).size, 0)
+
+    def test_index_cache_builds_once_and_evicts_the_oldest(self):
+        cache = IndexCache(max_entries=2)
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return np.arange(3.0), np.arange(3.0)
+
+        first = cache.get_or_build("a", lambda: load("a"))
+        self.assertIs(cache.get_or_build("a", lambda: load("a")), first)
+        cache.get_or_build("b", lambda: load("b"))
+        cache.get_or_build("c", lambda: load("c"))
+        cache.get_or_build("a", lambda: load("a"))
+        self.assertEqual(loads, ["a", "b", "c", "a"])
+
+
+class LogHandlerTests(SimpleTestCase):
+    def record(self, message):
+        return logging.LogRecord("info", logging.INFO, __file__, 0, message, None, None)
+
+    def test_full_queue_drops_and_counts_records(self):
+        console = ConsoleHandler(io.StringIO())
+        console.set_name("test_console")
+        handler = QueuedHandler(["test_console"])
+        log_queue = queue.Queue(maxsize=2)
+        with mock.patch.dict(log_handlers._process, dropped=0, reported=0), mock.patch.object(
+            log_handlers, "_get_queue", return_value=log_queue
+        ):
+            for index in range(5):
+                handler.enqueue(self.record(f"message {index}"))
+            self.assertEqual(log_handlers.dropped_records(), 3)
+            self.assertEqual([log_queue.get().getMessage() for _ in range(2)], ["message 0", "message 1"])
+
+            # With room again the next record is queued, followed by one warning about the drops
+            handler.enqueue(self.record("message 5"))
+            messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+            self.assertEqual(messages, ["message 5", "3 log records dropped, the log queue was full"])
+            handler.enqueue(self.record("message 6"))
+            self.assertEqual(log_queue.get_nowait().getMessage(), "message 6")
+            self.assertTrue(log_queue.empty())
+
+    def test_rotation_is_seen_by_every_handler_of_the_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        filename = os.path.join(directory.name, "log.log")
+        first, second = (
+            InterProcessRotatingFileHandler(filename, maxBytes=100, backupCount=2, delay=True) for _ in range(2)
+        )
+        for handler in (first, second):
+            self.addCleanup(handler.close)
+
+        second.emit(self.record("x" * 50))
+        # 51 + 3 * 19 bytes do not fit in 100: the first handler rotates before its third record
+        first.emit_batch([self.record(f"first handler {index:04}") for index in range(3)])
+        second.emit(self.record("second handler"))
+
+        with open(f"{filename}.1") as rotated, open(filename) as current:
+            self.assertEqual(rotated.read(), "x" * 50 + "\nfirst handler 0000\nfirst handler 0001\n")
+            # The second handler reopened the new file instead of writing to the rotated one
+            self.assertEqual(current.read(), "first handler 0002\nsecond handler\n")
+        self.assertFalse(os.path.exists(f"{filename}.2"))
@@ -0,0 +1,99 @@
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+logger_info = logging.getLogger("info")
+
+_points_seen = itertools.count()
+
+
+def _sample_every():
+    if not settings.configured:
+        return 0
+    return getattr(settings, "WAYPOINT_LOG_SAMPLE_EVERY", 0)
+
+
+def trace_point(message, *args):
+    """
+    Per-point DEBUG record, kept for one point in every WAYPOINT_LOG_SAMPLE_EVERY (0 turns it off).
+    ``message`` is %-formatted with ``args`` only for the records that are logged.
+    """
+    every = _sample_every()
+    if every and next(_points_seen) % every == 0:
+        logger_info.debug(message, *args)
+
+
+def extent(latitudes, longitudes):
+    """[min_lat, min_lon, max_lat, max_lon] of the points, None when there are none."""
+    latitudes = np.asarray(latitudes)
+    longitudes = np.asarray(longitudes)
+    if latitudes.size == 0:
+        return None
+    return [
+        round(float(latitudes.min()), 6),
+        round(float(longitudes.min()), 6),
+        round(float(latitudes.max()), 6),
+        round(float(longitudes.max()), 6),
+    ]
+
+
+class StageSummary(dict):
+    """Fields of one pipeline stage, rendered as ``key=value`` pairs."""
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.items())
+
+
+def _metrics_enabled():
+    return settings.configured and getattr(settings, "WAYPOINT_METRICS_ENABLED", False)
+
+
+def end_stage(name, start, points=None):
+    """
+    Record a stage that began at ``start`` (``time.perf_counter()``) and ends now, for stages that
+    do not fit in a with block. Returns the duration in seconds.
+    """
+    seconds = time.perf_counter() - start
+    if _metrics_enabled():
+        # Imported here so that planning code does not load the REST framework
+        from waypoint_generator.metrics import record_stage
+
+        record_stage(name, seconds, points)
+    return seconds
+
+
+@contextmanager
+def timed_stage(name, **fields):
+    """
+    Time a short stage of a request for the ``Server-Timing`` header and the stage histograms
+    (when WAYPOINT_METRICS_ENABLED), without logging it. Yields the summary like ``planning_stage``.
+    """
+    summary = StageSummary(stage=name, **fields)
+    start = time.perf_counter()
+    try:
+        yield summary
+    except Exception:
+        summary["failed"] = True
+        raise
+    finally:
+        summary["ms"] = round(end_stage(name, start, summary.get("points")) * 1000, 2)
+
+
+@contextmanager
+def planning_stage(name, **fields):
+    """
+    Time a stage of the planning pipeline and log one summary record when it ends.
+    Yields the summary so the stage can add its counts; the record also carries the
+    fields as ``record.planning_stage`` for structured handlers.
+    """
+    summary = None
+    try:
+        with timed_stage(name, **fields) as summary:
+            yield summary
+    finally:
+        if summary is not None:
+            logger_info.info("%s", summary, extra={"planning_stage": dict(summary)})
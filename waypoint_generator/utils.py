@@ -1,8 +1,16 @@
 import math
 import logging
 import warnings
-import matplotlib.pyplot as plt
-from shapely.geometry import Point, Polygon
+
+from waypoint_generator.grid import (
+    from_waypoints,
+    horizontal_axis,
+    serpentine_grid,
+    to_waypoints,
+    vertical_axis,
+)
+from waypoint_generator.geometry import average_step, filter_mask
+from waypoint_generator.tracing import trace_point
 
 logger = logging.getLogger(__name__)
 logger_info = logging.getLogger("info")
@@ -35,7 +43,7 @@ def get_bounding_box(polygon):
 
         return bounding_box
     except Exception as e:
-        logger_error(f"Bounding box generating error {str(e)}")
+        logger_error.error(f"Bounding box generating error {str(e)}")
         return []
 
 
@@ -58,36 +66,15 @@ def horizontal_move_point(lat, lon, distance, bearing):
         math.cos(distance / R) - math.sin(lat1) * math.sin(lat2),
     )
 
-    logger_info.info(f"Horizontal move point generated {math.degrees(lat2), math.degrees(lon2)}")
-    return math.degrees(lat2), math.degrees(lon2)
+    lat2, lon2 = math.degrees(lat2), math.degrees(lon2)
+    trace_point("Horizontal move point generated (%s, %s)", lat2, lon2)
+    return lat2, lon2
 
 
 def generate_horizontal_waypoints(polygon, altitude, overlapping_percentage, coverage_horizontal):
-    FOV = coverage_horizontal
-    overlap_distance = FOV * (overlapping_percentage / 100)
-    move_distance = FOV - overlap_distance
-    start_move = -(move_distance - abs((FOV / 2) - overlap_distance))
-    # start_move = abs((FOV/2) - overlap_distance) # Use this if want to start from bounding box bottom point
-
-    # Find the bounding box
-    min_lat = min(point["latitude"] for point in polygon)
-    max_lat = max(point["latitude"] for point in polygon)
-    min_lon = min(point["longitude"] for point in polygon)
-    max_lon = max(point["longitude"] for point in polygon)
-
-    # Find the start point (right-bottom corner)
-    right_bottom = {"latitude": min_lat, "longitude": max_lon}
-    start_lat, start_lon = horizontal_move_point(right_bottom["latitude"], right_bottom["longitude"], start_move, 0)
-    start_lat, start_lon = horizontal_move_point(start_lat, start_lon, start_move, 270)
-
-    # Generate waypoints
-    waypoints = []
-    lat, lon = start_lat, start_lon
-
-    min_lat, min_lon = vertical_move_point(min_lat, min_lon, move_distance, 270)
-    while lon > min_lon:
-        waypoints.append({"latitude": lat, "longitude": lon})
-        lat, lon = horizontal_move_point(lat, lon, move_distance, 270)  # Move left (west)
+    # Compatibility wrapper around the vectorized grid engine
+    latitudes, longitudes = horizontal_axis(polygon, overlapping_percentage, coverage_horizontal)
+    waypoints = to_waypoints(latitudes, longitudes)
 
     logger_info.info("Horizontal waypoint generated")
     return waypoints
@@ -107,37 +94,15 @@ def vertical_move_point(lat, lon, distance, bearing):
         math.cos(distance / R) - math.sin(lat1) * math.sin(lat2),
     )
 
-    logger_info.info(f"Vertical move point generated {math.degrees(lat2), math.degrees(lon2)}")
-    return math.degrees(lat2), math.degrees(lon2)
+    lat2, lon2 = math.degrees(lat2), math.degrees(lon2)
+    trace_point("Vertical move point generated (%s, %s)", lat2, lon2)
+    return lat2, lon2
 
 
 def generate_vertical_waypoints(polygon, altitude, overlapping_percentage, coverage_vertical):
-    FOV = coverage_vertical
-    overlap_distance = FOV * (overlapping_percentage / 100)
-    move_distance = FOV - overlap_distance
-    start_move = -(move_distance - abs((FOV / 2) - overlap_distance))
-    # start_move = abs((FOV / 2) - overlap_distance)
-
-    # Find the bounding box
-    min_lat = min(point["latitude"] for point in polygon)
-    max_lat = max(point["latitude"] for point in polygon)
-    min_lon = min(point["longitude"] for point in polygon)
-    max_lon = max(point["longitude"] for point in polygon)
-
-    # Find the start point (right-bottom corner)
-    right_bottom = {"latitude": min_lat, "longitude": max_lon}
-    begin_lat, begin_lon = vertical_move_point(right_bottom["latitude"], right_bottom["longitude"], start_move, 0)
-    begin_lat, begin_lon = vertical_move_point(begin_lat, begin_lon, start_move, 270)
-
-    # Generate waypoints
-    waypoints = []
-    lat, lon = begin_lat, begin_lon
-    direction = 0  # 0 for upward
-    max_lat, max_lon = vertical_move_point(max_lat, max_lon, move_distance, direction)
-
-    while lat <= max_lat:
-        waypoints.append({"latitude": lat, "longitude": lon})
-        lat, lon = vertical_move_point(lat, lon, move_distance, direction)
+    # Compatibility wrapper around the vectorized grid engine
+    latitudes, longitudes = vertical_axis(polygon, overlapping_percentage, coverage_vertical)
+    waypoints = to_waypoints(latitudes, longitudes)
 
     logger_info.info("Vertical waypoint generated")
     return waypoints
@@ -155,38 +120,25 @@ def decimal_to_dms(decimal_degrees):
     if not is_positive:
         degrees = -degrees
 
-    logger_info.info(f"decimal to dsm {degrees, minutes, seconds}")
+    trace_point("decimal to dms (%s, %s, %s)", degrees, minutes, seconds)
     return degrees, minutes, seconds
 
 
 def generate_all_points(vertical_points, horizontal_points):
-    # Extract latitudes and longitudes
-    vertical_latitudes = [point["latitude"] for point in vertical_points]
-    horizontal_longitudes = [point["longitude"] for point in horizontal_points]
-
-    reverse = False
-    all_points = []
-
-    first_lat = vertical_latitudes[0]
-    last_lat = vertical_latitudes[-1]
-
-    for lon in horizontal_longitudes:
-        if not reverse:
-            for lat in vertical_latitudes:
-                all_points.append({"latitude": lat, "longitude": lon})
-                if last_lat == lat:
-                    reverse = True
-        else:
-            for lat in vertical_latitudes[::-1]:
-                all_points.append({"latitude": lat, "longitude": lon})
-                if last_lat == lat:
-                    reverse = False
+    vertical_latitudes, _ = from_waypoints(vertical_points)
+    _, horizontal_longitudes = from_waypoints(horizontal_points)
+
+    latitudes, longitudes = serpentine_grid(vertical_latitudes, horizontal_longitudes)
+    all_points = to_waypoints(latitudes, longitudes)
 
     logger_info.info("All waypoint generated")
     return all_points
 
 
 def plot_waypoints(bounding_box, polygon, all_points):
+    # Only for local debugging, the API renders previews with waypoint_generator.preview
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
 
     # Extracting latitude and longitude from all points
@@ -260,16 +212,7 @@ def convert_polygon_to_decimal(polygon):
 
 
 def calculate_average_distance(points):
-    distances = []
-    for i in range(1, len(points)):
-        prev_point = points[i - 1]
-        curr_point = points[i]
-        distance = (
-            (curr_point["latitude"] - prev_point["latitude"]) ** 2
-            + (curr_point["longitude"] - prev_point["longitude"]) ** 2
-        ) ** 0.5
-        distances.append(distance)
-    return sum(distances) / len(distances) if distances else 0
+    return average_step(*from_waypoints(points))
 
 
 def is_point_just_outside(polygon, point, buffer_distance):
@@ -278,16 +221,8 @@ def is_point_just_outside(polygon, point, buffer_distance):
 
 
 def filter_points(points, polygon_coords):
-    buffer_distance = calculate_average_distance(points)
-    polygon = Polygon([(p["longitude"], p["latitude"]) for p in polygon_coords])
-    inside_points = []
-    just_outside_points = []
-
-    for p in points:
-        point = Point(p["longitude"], p["latitude"])
-        if polygon.contains(point):
-            inside_points.append(p)
-        elif is_point_just_outside(polygon, point, buffer_distance):
-            inside_points.append(p)
+    latitudes, longitudes = from_waypoints(points)
+    mask = filter_mask(latitudes, longitudes, polygon_coords)
+    inside_points = [p for p, keep in zip(points, mask.tolist()) if keep]
 
     return inside_points
@@ -1,25 +1,36 @@
+import time
+
+import numpy as np
 from rest_framework.viewsets import ModelViewSet
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import Http404, HttpResponse
 
 from waypoint_generator.models import FlightPath
 from waypoint_generator.serializers import FlightPathSerializer
+from accounts_engine.authentication import CachedJWTAuthentication, StatelessJWTAuthentication
 from accounts_engine.utils import success_true_response, success_false_response
 
 from waypoint_generator.services import GoProHero9Black
 from waypoint_generator.utils import (
-    generate_horizontal_waypoints,
-    generate_vertical_waypoints,
-    generate_all_points,
     get_bounding_box,
-    plot_waypoints,
     convert_polygon_to_decimal,
-    filter_points,
 )
+from waypoint_generator.geometry import filter_mask
+from waypoint_generator.grid import generate_grid, to_waypoints
+from waypoint_generator.metrics import PrometheusRenderer, render_metrics
+from waypoint_generator.pipeline import estimate_plan_size, get_plan_key, load_saved_plan, plan_batch, plan_cache
+from waypoint_generator.planner import GRID, PLANNING_MODES, plan_waypoints
+from waypoint_generator.preview import CONTENT_TYPES, PNGRenderer, PreviewCache, SVGRenderer, render_preview
+from waypoint_generator.profiling import profiled
+from waypoint_generator.spatial import IndexCache
+from waypoint_generator.streaming import NDJSON, NDJSONRenderer, stream_waypoints
+from waypoint_generator.tracing import end_stage, extent, planning_stage, timed_stage
 
 import logging
 
@@ -27,6 +38,11 @@ logger = logging.getLogger(__name__)
 logger_info = logging.getLogger("info")
 logger_error = logging.getLogger("error")
 
+index_cache = IndexCache(max_entries=settings.WAYPOINT_INDEX_CACHE_ENTRIES)
+preview_cache = PreviewCache(
+    max_workers=settings.WAYPOINT_PREVIEW_WORKERS, max_bytes=settings.WAYPOINT_PREVIEW_CACHE_BYTES
+)
+
 
 @api_view(["GET"])
 def home(request):
@@ -34,23 +50,37 @@ def home(request):
 
 
 class FlightPathViewSet(ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     queryset = FlightPath.objects.all().order_by("-created_datetime")
     serializer_class = FlightPathSerializer
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
 
     def __init__(self, *args, **kwargs):
         self.get_bounding_box = kwargs.pop("get_bounding_box", get_bounding_box)
         self.camera = kwargs.pop("camera", GoProHero9Black())
-        self.generate_vertical_waypoints = kwargs.pop("generate_vertical_waypoints", generate_vertical_waypoints)
-        self.generate_horizontal_waypoints = kwargs.pop("generate_horizontal_waypoints", generate_horizontal_waypoints)
-        self.generate_all_points = kwargs.pop("generate_all_points", generate_all_points)
-        self.plot_waypoints = kwargs.pop("plot_waypoints", plot_waypoints)
+        self.generate_grid = kwargs.pop("generate_grid", generate_grid)
         self.convert_polygon_to_decimal = kwargs.pop("convert_polygon_to_decimal", convert_polygon_to_decimal)
-        self.filter_points = kwargs.pop("filter_points", filter_points)
+        self.filter_mask = kwargs.pop("filter_mask", filter_mask)
+        # The grid mode plans on arrays now, the per-point list helpers are still accepted but unused
+        for name in (
+            "generate_vertical_waypoints",
+            "generate_horizontal_waypoints",
+            "generate_all_points",
+            "filter_points",
+        ):
+            kwargs.pop(name, None)
+        # Create no longer plots the route (see the preview action), the old hook is accepted and ignored
+        kwargs.pop("plot_waypoints", None)
+        self.plan_waypoints = kwargs.pop("plan_waypoints", plan_waypoints)
+        self.plan_cache = kwargs.pop("plan_cache", plan_cache)
+        self.plan_batch = kwargs.pop("plan_batch", plan_batch)
+        self.index_cache = kwargs.pop("index_cache", index_cache)
+        self.preview_cache = kwargs.pop("preview_cache", preview_cache)
+        self.render_preview = kwargs.pop("render_preview", render_preview)
         super().__init__(*args, **kwargs)
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in ["create", "update", "partial_update", "destroy", "batch", "cache_stats", "metrics"]:
             self.permission_classes = [IsAuthenticated, IsAdminUser]
         return super(FlightPathViewSet, self).get_permissions()
 
@@ -64,7 +94,300 @@ class FlightPathViewSet(ModelViewSet):
         if self.action == "list":
             sorted_queryset = FlightPath.objects.all().order_by("-created_datetime")
             return sorted_queryset
+        return super().get_queryset()
+
+    def get_stream_format(self, request):
+        """NDJSON for "Accept: application/x-ndjson" (or ?format=ndjson), chunked JSON for ?stream=true."""
+        if request.accepted_renderer.format == NDJSON:
+            return NDJSON
+        if request.query_params.get("stream", "").lower() in ("1", "true", "yes"):
+            return "json"
+        return None
+
+    def should_plan_in_background(self, key, polygon, altitude, overlapping_percentage):
+        threshold = settings.WAYPOINT_ASYNC_MIN_POINTS
+        if not threshold or self.plan_cache.get(key) is not None:
+            return False
+        if estimate_plan_size(polygon, altitude, overlapping_percentage, self.camera) < threshold:
+            return False
+        # A flight path already planned with the same key answers at once, kept in memory for the request
+        saved = load_saved_plan(key)
+        if saved is None:
+            return True
+        self.plan_cache.put(key, *saved)
+        return False
+
+    def compute_waypoints(self, polygon, bounding_box, altitude, overlapping_percentage, planning_mode):
+        # Calculate FOV
+        coverage_vertical, coverage_horizontal = self.camera.get_fov(altitude)
+
+        if planning_mode == GRID:
+            with planning_stage("grid") as summary:
+                latitudes, longitudes = self.generate_grid(
+                    bounding_box, overlapping_percentage, coverage_vertical, coverage_horizontal
+                )
+                summary["points"] = len(latitudes)
+
+            with planning_stage("filter") as summary:
+                mask = self.filter_mask(latitudes, longitudes, polygon)
+                latitudes, longitudes = latitudes[mask], longitudes[mask]
+                summary["points"] = len(latitudes)
+            return latitudes, longitudes
+
+        # Only generate the sweep segments that cover the polygon
+        return self.plan_waypoints(
+            polygon,
+            overlapping_percentage,
+            coverage_vertical,
+            coverage_horizontal,
+            mode=planning_mode,
+            sweep_objective=settings.WAYPOINT_SWEEP_OBJECTIVE,
+            search_budget=settings.WAYPOINT_SWEEP_SEARCH_SECONDS,
+        )
+
+    def get_waypoint_window(self, request):
+        """
+        Parse the ?offset=&limit= and ?bbox=min_lat,min_lon,max_lat,max_lon query parameters.
+        Returns None when the whole plan is requested.
+        """
+        params = request.query_params
+        if not any(name in params for name in ("offset", "limit", "bbox")):
+            return None
+
+        window = {"offset": 0, "limit": None, "bbox": None}
+        for name in ("offset", "limit"):
+            if name in params:
+                try:
+                    window[name] = int(params[name])
+                except ValueError:
+                    window[name] = -1
+                if window[name] < 0:
+                    raise ValidationError({name: [f"{name.capitalize()} must be a non-negative integer."]})
+
+        if "bbox" in params:
+            message = "Bounding box must be min_lat,min_lon,max_lat,max_lon."
+            try:
+                bbox = [float(value) for value in params["bbox"].split(",")]
+            except ValueError:
+                raise ValidationError({"bbox": [message]})
+            if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise ValidationError({"bbox": [message]})
+            window["bbox"] = bbox
+        return window
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            window = self.get_waypoint_window(request)
+        except ValidationError as e:
+            message = self.get_validation_message(e)
+            logger_error.error(message)
+            return Response(success_false_response(message=message), status=e.status_code)
+        if window is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        flight_path = self.get_object()
+        context = dict(self.get_serializer_context(), exclude_waypoints=True)
+        data = self.get_serializer_class()(flight_path, context=context).data
+
+        arrays = flight_path.waypoint_arrays
+        latitudes, longitudes = arrays if arrays is not None else (np.empty(0), np.empty(0))
+        if window["bbox"] is not None:
+            # Route indexes of the waypoints in the box, from the cached per-plan index
+            cache_key = (flight_path.id, flight_path.updated_datetime)
+            spatial_index = self.index_cache.get_or_build(cache_key, lambda: (latitudes, longitudes))
+            indexes = spatial_index.query(*window["bbox"])
+        else:
+            indexes = None
+
+        total = latitudes.size if indexes is None else indexes.size
+        start = window["offset"]
+        stop = total if window["limit"] is None else start + window["limit"]
+        if indexes is None:
+            data["waypoints"] = to_waypoints(latitudes[start:stop], longitudes[start:stop])
+        else:
+            indexes = indexes[start:stop]
+            data["waypoints"] = to_waypoints(latitudes[indexes], longitudes[indexes])
+            data["waypoint_indexes"] = indexes.tolist()
+        data["waypoint_count"] = total
+        data["offset"] = window["offset"]
+        data["limit"] = window["limit"]
+        return Response(data)
+
+    @action(detail=True, methods=["GET"], renderer_classes=[PNGRenderer, SVGRenderer])
+    def preview(self, request, *args, **kwargs):
+        """Plot of the planned route as PNG (default) or SVG ("Accept: image/svg+xml" or ?format=svg)."""
+        try:
+            flight_path = self.get_object()
+            arrays = flight_path.waypoint_arrays
+            if arrays is None:
+                return Response(
+                    success_false_response(message="Waypoints are not generated yet."),
+                    status=status.HTTP_409_CONFLICT,
+                    content_type="application/json",
+                )
+
+            image_format = request.accepted_renderer.format
+            polygon = self.convert_polygon_to_decimal(flight_path.polygon_lat_lon)
+            with timed_stage("render"):
+                image = self.preview_cache.get_or_render(
+                    (flight_path.id, flight_path.updated_datetime, image_format),
+                    lambda: self.render_preview(
+                        polygon, *arrays, image_format=image_format, max_points=settings.WAYPOINT_PREVIEW_MAX_POINTS
+                    ),
+                    timeout=settings.WAYPOINT_PREVIEW_TIMEOUT_SECONDS,
+                )
+            return HttpResponse(image, content_type=CONTENT_TYPES[image_format])
+
+        except Http404:
+            return Response(
+                success_false_response(message="Flight path not found."),
+                status=status.HTTP_404_NOT_FOUND,
+                content_type="application/json",
+            )
+
+        except Exception as e:
+            logger_error.error(f"Preview rendering failed: {str(e)}")
+            return Response(
+                success_false_response(message="An unexpected error occurred. Please try again later."),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content_type="application/json",
+            )
 
+    # Polled while a plan runs, the identity comes from the token alone
+    @action(detail=True, methods=["GET"], url_path="status", authentication_classes=[StatelessJWTAuthentication])
+    def job_status(self, request, *args, **kwargs):
+        try:
+            flight_path = self.get_object()
+            data = {
+                "id": flight_path.id,
+                "status": flight_path.status,
+                "error": flight_path.error_message,
+                "waypoint_count": flight_path.waypoint_count,
+            }
+            return Response(success_true_response(data=data))
+
+        except Http404:
+            return Response(success_false_response(message="Flight path not found."), status=status.HTTP_404_NOT_FOUND)
+
+    def get_validation_message(self, error):
+        # First message of a ValidationError, as the create endpoint reports it
+        detail = error.detail
+        while isinstance(detail, (dict, list)) and detail:
+            detail = next(iter(detail.values())) if isinstance(detail, dict) else detail[0]
+        return str(detail)
+
+    def validate_planning_mode(self, planning_mode):
+        if planning_mode not in PLANNING_MODES:
+            message = f"Planning mode must be one of: {', '.join(PLANNING_MODES)}."
+            raise ValidationError({"planning_mode": [message]})
+        return planning_mode
+
+    @action(detail=False, methods=["POST"])
+    def batch(self, request, *args, **kwargs):
+        """
+        Plan many flight paths in one request: {"flight_paths": [{polygon_lat_lon, altitude,
+        overlapping_percentage, planning_mode}, ...]}. Every item is validated and planned on its
+        own, the valid ones are saved with a single insert and the response lists an id or an
+        error for each item, in request order. Items estimated above WAYPOINT_ASYNC_MIN_POINTS are
+        saved as queued for the planning worker, like in create.
+        """
+        try:
+            user = request.user
+            items = request.data.get("flight_paths")
+            if not isinstance(items, list) or not items:
+                message = "flight_paths must be a non-empty list."
+                logger_error.error(message)
+                return Response(success_false_response(message=message), status=status.HTTP_400_BAD_REQUEST)
+            if len(items) > settings.WAYPOINT_BATCH_MAX_ITEMS:
+                message = f"A batch can contain at most {settings.WAYPOINT_BATCH_MAX_ITEMS} flight paths."
+                logger_error.error(message)
+                return Response(success_false_response(message=message), status=status.HTTP_400_BAD_REQUEST)
+
+            results = [None] * len(items)
+            valid, jobs, flight_paths = [], [], []
+            for index, item in enumerate(items):
+                try:
+                    if not isinstance(item, dict):
+                        raise ValidationError({"flight_path": ["Each flight path must be an object."]})
+                    requested_data = dict(item, user=user.id)
+                    serializer = self.get_serializer(data=requested_data)
+                    serializer.is_valid(raise_exception=True)
+                    planning_mode = self.validate_planning_mode(
+                        requested_data.get("planning_mode", settings.WAYPOINT_PLANNING_MODE)
+                    )
+                    polygon = self.convert_polygon_to_decimal(requested_data["polygon_lat_lon"])
+                except ValidationError as e:
+                    results[index] = {"index": index, "success": False, "message": self.get_validation_message(e)}
+                    continue
+
+                data = serializer.validated_data
+                altitude, overlapping_percentage = data["altitude"], data["overlapping_percentage"]
+                key = get_plan_key(polygon, altitude, overlapping_percentage, self.camera, planning_mode)
+                if self.should_plan_in_background(key, polygon, altitude, overlapping_percentage):
+                    fields = dict(data, plan_key=key, planning_mode=planning_mode, status=FlightPath.QUEUED)
+                    flight_paths.append((index, FlightPath(**fields)))
+                    continue
+                valid.append((index, data, planning_mode))
+                jobs.append((polygon, altitude, overlapping_percentage, planning_mode))
+
+            planned = self.plan_batch(jobs, self.camera) if jobs else []
+            for (index, data, planning_mode), (key, plan) in zip(valid, planned):
+                if isinstance(plan, Exception):
+                    results[index] = {"index": index, "success": False, "message": "Waypoints could not be generated."}
+                    continue
+                fields = dict(data, plan_key=key, planning_mode=planning_mode, status=FlightPath.DONE)
+                flight_path = FlightPath(**fields)
+                flight_path.set_waypoints(*plan)
+                flight_paths.append((index, flight_path))
+
+            flight_paths.sort(key=lambda entry: entry[0])
+            FlightPath.objects.bulk_create([flight_path for _, flight_path in flight_paths])
+            for index, flight_path in flight_paths:
+                results[index] = {
+                    "index": index,
+                    "success": True,
+                    "id": flight_path.id,
+                    "status": flight_path.status,
+                    "waypoint_count": flight_path.waypoint_count,
+                }
+
+            queued = sum(flight_path.status == FlightPath.QUEUED for _, flight_path in flight_paths)
+            message = f"{len(flight_paths) - queued} of {len(items)} flight paths generated, {queued} queued"
+            if not flight_paths:
+                logger_error.error(message)
+                return Response(
+                    success_false_response(data={"results": results}, message=message),
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            logger_info.info(f"{message} by {user.username}")
+            return Response(
+                success_true_response(data={"results": results}, message=message), status=status.HTTP_201_CREATED
+            )
+
+        except Exception as e:
+            message = str(e)
+            logger_error.error(message)
+            return Response(
+                success_false_response(message="An unexpected error occurred. Please try again later."),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @action(detail=False, methods=["GET"])
+    def cache_stats(self, request, *args, **kwargs):
+        return Response(success_true_response(data=self.plan_cache.stats()))
+
+    @action(detail=False, methods=["GET"], renderer_classes=[PrometheusRenderer])
+    def metrics(self, request, *args, **kwargs):
+        """Stage histograms of this process in the Prometheus text format."""
+        if not settings.WAYPOINT_METRICS_ENABLED:
+            return Response(
+                success_false_response(message="Metrics are disabled."),
+                status=status.HTTP_404_NOT_FOUND,
+                content_type="application/json",
+            )
+        return Response(render_metrics())
+
+    @profiled
     def create(self, request, *args, **kwargs):
         try:
             user = request.user
@@ -78,35 +401,81 @@ class FlightPathViewSet(ModelViewSet):
 
                 polygon = requested_data["polygon_lat_lon"]
                 # Convert polygon coordinates to decimal if in dms
-                polygon = self.convert_polygon_to_decimal(polygon)
-                bounding_box = self.get_bounding_box(polygon)
+                with timed_stage("convert"):
+                    polygon = self.convert_polygon_to_decimal(polygon)
+                with timed_stage("bounding_box"):
+                    bounding_box = self.get_bounding_box(polygon)
                 overlapping_percentage = requested_data["overlapping_percentage"]
                 altitude = requested_data["altitude"]
 
-                # Calculate FOV
-                coverage_vertical, coverage_horizontal = self.camera.get_fov(altitude)
-
-                vertical_waypoints = self.generate_vertical_waypoints(
-                    bounding_box, altitude, overlapping_percentage, coverage_vertical
-                )
-                horizontal_waypoints = self.generate_horizontal_waypoints(
-                    bounding_box, altitude, overlapping_percentage, coverage_horizontal
+                planning_mode = self.validate_planning_mode(
+                    requested_data.get("planning_mode", settings.WAYPOINT_PLANNING_MODE)
                 )
 
-                # Now generate all points
-                all_points = self.generate_all_points(vertical_waypoints, horizontal_waypoints)
+                # Identical fields, parameters and camera always give the same plan
+                key = get_plan_key(polygon, altitude, overlapping_percentage, self.camera, planning_mode)
 
-                all_filter_points = self.filter_points(all_points, polygon)
+                if self.should_plan_in_background(key, polygon, altitude, overlapping_percentage):
+                    flight_path = serializer.save(
+                        user=user, waypoints=None, plan_key=key, planning_mode=planning_mode, status=FlightPath.QUEUED
+                    )
+                    message = "Flight path queued for planning"
+                    logger_info.info(f"{message} by {user.username}, id: {flight_path.id}")
+                    return Response(
+                        success_true_response(
+                            data={"id": flight_path.id, "status": flight_path.status}, message=message
+                        ),
+                        status=status.HTTP_202_ACCEPTED,
+                    )
 
-                self.plot_waypoints(bounding_box, polygon, all_filter_points)
+                with planning_stage("waypoints", mode=planning_mode) as summary:
+                    latitudes, longitudes = self.plan_cache.get_or_compute(
+                        key,
+                        lambda: self.compute_waypoints(
+                            polygon, bounding_box, altitude, overlapping_percentage, planning_mode
+                        ),
+                        load=lambda: load_saved_plan(key),
+                    )
+                    summary["points"] = len(latitudes)
+                    summary["bbox"] = extent(latitudes, longitudes)
 
-                flight_path = serializer.save(user=user, waypoints=all_filter_points)
+                with planning_stage("save") as summary:
+                    waypoints_data = FlightPath.pack_waypoints(latitudes, longitudes)
+                    summary["bytes"] = len(waypoints_data)
+                    flight_path = serializer.save(
+                        user=user,
+                        waypoints=None,
+                        waypoints_data=waypoints_data,
+                        plan_key=key,
+                        planning_mode=planning_mode,
+                    )
                 message = "Waypoints generated successfully"
                 logger_info.info(f"{message} by {user.username}")
-                return Response(
+
+                stream_format = self.get_stream_format(request)
+                if stream_format:
+                    # Encoded chunk by chunk from the arrays, no waypoint list is built
+                    return stream_waypoints(
+                        success_true_response(data={"id": flight_path.id}, message=message),
+                        latitudes,
+                        longitudes,
+                        ndjson=stream_format == NDJSON,
+                        status=status.HTTP_201_CREATED,
+                    )
+                serialize_start = time.perf_counter()
+
+                def serialized(rendered_response):
+                    # Post-render callbacks must return None or they replace the response
+                    end_stage("serialize", serialize_start)
+
+                all_filter_points = to_waypoints(latitudes, longitudes)
+                response = Response(
                     success_true_response(data={"id": flight_path.id, "waypoints": all_filter_points}, message=message),
                     status=status.HTTP_201_CREATED,
                 )
+                # Rendering happens after the view returns, it is timed up to the rendered body
+                response.add_post_render_callback(serialized)
+                return response
 
             except ValidationError as e:
                 error_detail = e.detail